@@ -0,0 +1,147 @@
+"""
+end to end simulation of the lib.bulk log download on linux.
+two simulated radios share a lossy half duplex channel with lora airtime; the rocket side
+runs lib.bulk.serve and the ground side lib.bulk.fetch, unchanged, on asyncio. time can be
+compressed with --scale: both sides are given a clock running at link time, so every
+timeout behaves as it would on the real link.
+
+    python -m ground.bulksim --size 100000 --loss 0.1
+"""
+import argparse
+import asyncio
+import io
+import random
+
+from lib.bulk import serve, fetch
+
+
+def lora_airtime_ms(length: int, sf: int = 7, bandwidth: int = 500000, coding_rate: int = 5,
+                    preamble: int = 8, crc: bool = True) -> float:
+    """semtech time on air of length payload bytes plus the 4 byte radiohead header."""
+    symbol_ms = (1 << sf) * 1000 / bandwidth
+    ldro = symbol_ms > 16
+    bits = 8 * (length + 4) - 4 * sf + 28 + 16 * crc
+    symbols = 8 + max(-(-bits // (4 * (sf - 2 * ldro))) * coding_rate, 0)
+    return (preamble + 4.25 + symbols) * symbol_ms
+
+
+class Channel:
+    """lossy link between two radios, in both directions."""
+
+    def __init__(self, loss: float = 0.0, scale: float = 1.0, turnaround_ms: float = 2.0, seed=None, **modem):
+        self.loss = loss
+        self.scale = scale
+        self.turnaround_ms = turnaround_ms
+        self.modem = modem
+        self.random = random.Random(seed)
+        self.airtime_ms = 0.0  # total time the channel was keyed, unscaled
+        self.sent = 0
+        self.lost = 0
+
+
+class SimRadio:
+    """
+    the part of the RFM9x interface lib.bulk uses. a packet reaches the other radio after
+    its airtime unless the channel loses it or the other radio was transmitting meanwhile.
+    """
+
+    def __init__(self, channel: Channel):
+        self.channel = channel
+        self.peer = None
+        self.tx_payload = memoryview(bytearray(251))
+        self._inbox = asyncio.Queue()
+        self._busy_until = 0.0
+
+    async def send_payload_async(self, length: int, *, keep_listening=False):
+        channel = self.channel
+        airtime = lora_airtime_ms(length, **channel.modem)
+        channel.airtime_ms += airtime
+        channel.sent += 1
+        packet = bytes(self.tx_payload[:length])
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        duration = (airtime + channel.turnaround_ms) * channel.scale / 1000
+        self._busy_until = start + duration
+        await asyncio.sleep(duration)
+        if channel.random.random() < channel.loss or self.peer._busy_until > start:
+            channel.lost += 1
+        else:
+            self.peer._inbox.put_nowait(packet)
+        return True
+
+    async def receive_async(self, buf, *, with_header=False, timeout=None):
+        try:
+            packet = await asyncio.wait_for(
+                self._inbox.get(), None if timeout is None else timeout * self.channel.scale / 1000)
+        except asyncio.TimeoutError:
+            return 0
+        buf[:len(packet)] = packet
+        return len(packet)
+
+
+class _Sink(io.BytesIO):
+    # remembers when the last byte arrived, fetch lingers after that
+    def __init__(self, initial: bytes, clock):
+        super().__init__(initial)
+        self.clock = clock
+        self.finished = 0
+
+    def write(self, data):
+        self.finished = self.clock()
+        return super().write(data)
+
+
+async def simulate(size: int, loss: float, scale: float, window: int, offset: int = 0, seed=None, **modem):
+    channel = Channel(loss, scale, seed=seed, **modem)
+    rocket, ground = SimRadio(channel), SimRadio(channel)
+    rocket.peer, ground.peer = ground, rocket
+    data = random.Random(seed).randbytes(size)
+    loop = asyncio.get_running_loop()
+    origin = loop.time()
+
+    def clock():
+        # link time in ms
+        return int((loop.time() - origin) / scale * 1000)
+
+    sink = _Sink(data[:offset], clock)
+
+    # a few data packet airtimes, like a caller would pick for its modem profile
+    timeout = max(1000, int(3 * lora_airtime_ms(251, **modem)))
+    server = asyncio.create_task(serve(rocket, io.BytesIO(data), size, window=window, rto=timeout,
+                                       idle_ms=60000, clock=clock))
+    receiver = await fetch(ground, sink, offset, request_ms=timeout, clock=clock)
+    elapsed = max(sink.finished, 1) / 1000
+    sender = await server
+    return {
+        'complete': receiver.done and sink.getvalue() == data,
+        'bytes': size - offset,
+        'seconds': elapsed,
+        'goodput_bps': 8 * (size - offset) / elapsed,
+        'airtime_s': channel.airtime_ms / 1000,
+        'packets': channel.sent,
+        'lost': channel.lost,
+        'retransmissions': sender.retransmissions,
+        'srtt_ms': sender.srtt,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000, help='log size in bytes')
+    parser.add_argument('--offset', type=int, default=0, help='resume from this many bytes')
+    parser.add_argument('--loss', type=float, default=0.1, help='packet loss probability')
+    parser.add_argument('--window', type=int, default=16)
+    parser.add_argument('--sf', type=int, default=7)
+    parser.add_argument('--bandwidth', type=int, default=500000)
+    parser.add_argument('--scale', type=float, default=0.05, help='simulated seconds per link second')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    result = asyncio.run(simulate(args.size, args.loss, args.scale, args.window, args.offset,
+                                  args.seed, sf=args.sf, bandwidth=args.bandwidth))
+    for key, value in result.items():
+        print(f'{key:>16}: {value:.1f}' if isinstance(value, float) else f'{key:>16}: {value}')
+    return 0 if result['complete'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+"""
+vectorized decoding of telemetry packets on the ground station (cpython + numpy).
+the numpy layouts are built from the field tables in lib.telemetry, the same tables the
+flight encoder packs from, so the two sides cannot disagree on the layout.
+"""
+import numpy as np
+
+from lib.telemetry import (
+    HEADER_FIELDS,
+    SLOW_FIELDS,
+    SAMPLE_FIELDS,
+    HEADER_SIZE,
+    SLOW_SIZE,
+    SAMPLE_SIZE,
+    MAX_SAMPLES,
+    NEWEST_FIELDS,
+    VERSION,
+    batch_size,
+)
+
+
+def _dtype(fields) -> np.dtype:
+    return np.dtype([(name, '<' + code) for name, code, _, _ in fields])
+
+
+HEADER_DTYPE = _dtype(HEADER_FIELDS)
+SLOW_DTYPE = _dtype(SLOW_FIELDS)
+SAMPLE_DTYPE = _dtype(SAMPLE_FIELDS)
+
+
+def packet_dtype(count: int) -> np.dtype:
+    """numpy layout of a whole batch packet holding count samples."""
+    return np.dtype(
+        [(name, HEADER_DTYPE[name]) for name in HEADER_DTYPE.names]
+        + [(name, SLOW_DTYPE[name]) for name in SLOW_DTYPE.names]
+        + [('samples', SAMPLE_DTYPE, (count,))]
+    )
+
+
+def _column(name, code, scale):
+    if scale is not None:
+        return name, '<f8' if code in 'iI' else '<f4'
+    return name, '<i8'
+
+
+def _is_part(name, fields) -> bool:
+    # high bits of another field, merged into it when decoding
+    return name.endswith('_hi') and any(field[0] == name[:-3] for field in fields)
+
+
+# one row per imu sample, every field in engineering units:
+# the index of the packet it came from, its sequence number, the absolute sample tick,
+# the packet's own fields and the sample's fields. the packet's attitude (NEWEST_FIELDS)
+# is only on the row of its newest sample and nan on the others
+ROW_DTYPE = np.dtype(
+    [('packet', '<i8'), ('seq', '<i8'), ('tick', '<i8')]
+    + [_column(name, code, scale) for name, code, scale, _ in SLOW_FIELDS
+       if not _is_part(name, SLOW_FIELDS)]
+    + [_column(name, code, scale) for name, code, scale, _ in SAMPLE_FIELDS
+       if name != 'dt']
+)
+
+
+def _fill(rows, source, fields, repeat):
+    for name, code, scale, _ in fields:
+        if name not in rows.dtype.names:
+            continue
+        values = source[name].astype(np.int64)
+        hi = name + '_hi'
+        if hi in source.dtype.names:
+            values |= source[hi].astype(np.int64) << (8 * source.dtype[name].itemsize)
+        if repeat > 1:
+            values = np.repeat(values, repeat)
+        rows[name] = values * scale if scale is not None else values
+
+
+def decode_packets(packets) -> np.ndarray:
+    """
+    decodes a sequence of batch packets into a structured array of ROW_DTYPE, one row per
+    imu sample, in packet order.
+    packets of the same length have the same layout, so each length group is decoded
+    with a single frombuffer call and whole-column arithmetic instead of a python loop
+    per packet. packets of another version or with an inconsistent length are skipped.
+    """
+    groups = {}
+    for index, packet in enumerate(packets):
+        groups.setdefault(len(packet), ([], []))
+        groups[len(packet)][0].append(index)
+        groups[len(packet)][1].append(bytes(packet))
+
+    parts = []
+    for length, (indices, chunks) in groups.items():
+        count = (length - HEADER_SIZE - SLOW_SIZE) // SAMPLE_SIZE
+        if not 0 < count <= MAX_SAMPLES or length != batch_size(count):
+            continue
+        raw = np.frombuffer(b''.join(chunks), dtype=packet_dtype(count))
+        valid = (raw['version'] == VERSION) & (raw['count'] == count)
+        raw = raw[valid]
+        samples = raw['samples'].reshape(-1)
+
+        rows = np.empty(len(samples), ROW_DTYPE)
+        rows['packet'] = np.repeat(np.asarray(indices, np.int64)[valid], count)
+        rows['seq'] = np.repeat(raw['seq'], count)
+        rows['tick'] = np.repeat(raw['base_tick'].astype(np.int64), count) + samples['dt']
+        _fill(rows, raw, SLOW_FIELDS, count)
+        older = np.arange(len(rows)) % count != count - 1
+        for name in NEWEST_FIELDS:
+            rows[name][older] = np.nan
+        _fill(rows, samples, SAMPLE_FIELDS, 1)
+        parts.append(rows)
+
+    if not parts:
+        return np.empty(0, ROW_DTYPE)
+    rows = np.concatenate(parts)
+    return rows[np.argsort(rows['packet'], kind='stable')]
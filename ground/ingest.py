@@ -0,0 +1,257 @@
+"""
+ground station ingest service.
+reads bridge frames (see lib.telemetry) forwarded by the ground receiver (tests/bridge.py)
+from a serial port, or from a file or pipe standing in for it, decodes the telemetry in
+batches and streams it into a session directory with two columnar tables:
+    samples/  one row per imu sample, see ground.decode.ROW_DTYPE
+    packets/  one row per received packet with its link metadata
+
+    python -m ground.ingest --serial /dev/ttyACM0 session/
+    python -m ground.ingest --file capture.bin session/
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+try:
+    import serial
+except ImportError:  # pyserial is only needed for a live serial bridge
+    serial = None
+
+from lib.telemetry import (
+    BRIDGE_SYNC,
+    BRIDGE_HEADER_FORMAT,
+    BRIDGE_HEADER_SIZE,
+    SLOW_FIELDS,
+    SAMPLE_FIELDS,
+    packet_seq,
+)
+from lib.fec import FecDecoder, is_repair
+from ground.decode import decode_packets, ROW_DTYPE
+from ground.store import ColumnStore, load
+
+PACKET_DTYPE = np.dtype([
+    ('packet', '<i8'),  # index of the packet in the session, joins samples.packet
+    ('host_time', '<f8'),  # unix time at which the host read the frame
+    ('rx_tick', '<i8'),  # ground receiver ticks_ms when the packet arrived
+    ('rssi', '<i2'),  # dBm
+    ('snr', '<f4'),  # dB
+    ('length', '<i2'),
+    ('seq', '<i4'),  # telemetry sequence number, -1 if the packet did not decode
+    ('kind', '<u1'),  # DATA, REPAIR or RECOVERED
+])
+
+# packets.kind
+DATA = 0  # telemetry packet as received
+REPAIR = 1  # fec repair packet
+RECOVERED = 2  # telemetry packet rebuilt from a repair packet, link fields are the repair's
+
+UNITS = {name: unit for name, _, _, unit in SLOW_FIELDS + SAMPLE_FIELDS if unit}
+UNITS['tick'] = 'ms'
+
+
+class FrameReader:
+    """
+    splits a byte stream into bridge frames, resynchronising on the sync word after
+    garbage or a corrupted frame.
+    """
+
+    skipped: int  # bytes discarded while looking for a frame
+
+    corrupted: int  # frames dropped on a checksum mismatch
+
+    def __init__(self):
+        self.skipped = 0
+        self.corrupted = 0
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """
+        consumes data and returns the complete frames in it as
+        (packet, rx_tick, rssi, snr) tuples, keeping any partial frame for the next call.
+        """
+        buf = self._buffer
+        buf += data
+        frames = []
+        pos = 0
+        while True:
+            start = buf.find(BRIDGE_SYNC, pos)
+            if start < 0:
+                # keep a trailing byte that may be the first half of the sync word
+                keep = len(buf) - 1 if buf[-1:] == BRIDGE_SYNC[:1] else len(buf)
+                self.skipped += keep - pos
+                pos = keep
+                break
+            self.skipped += start - pos
+            body = start + len(BRIDGE_SYNC)
+            if len(buf) < body + BRIDGE_HEADER_SIZE:
+                pos = start
+                break
+            length, rx_tick, rssi, snr = struct.unpack_from(BRIDGE_HEADER_FORMAT, buf, body)
+            end = body + BRIDGE_HEADER_SIZE + length
+            if len(buf) < end + 1:
+                pos = start
+                break
+            if sum(buf[body:end]) & 0xFF != buf[end]:
+                # not a frame after all, look for the next sync word
+                self.corrupted += 1
+                self.skipped += len(BRIDGE_SYNC)
+                pos = body
+                continue
+            frames.append((bytes(buf[body + BRIDGE_HEADER_SIZE:end]), rx_tick, rssi, snr / 4))
+            pos = end + 1
+        del buf[:pos]
+        return frames
+
+
+def _seq(packet: bytes) -> int:
+    seq = packet_seq(packet)
+    return -1 if seq is None else seq
+
+
+class Session:
+    """
+    a recording in progress: decodes received frames in batches and appends them to the
+    samples and packets tables of the session directory. telemetry packets lost on the
+    link are rebuilt from the fec repair packets when possible and stored as RECOVERED.
+    """
+
+    packets: int  # packets received so far, including earlier runs on the same session
+
+    def __init__(self, path: str, batch_packets: int = 256):
+        # the session batches already, so the stores write on every commit: samples
+        # first, then packets, whose row count is the commit point of the session
+        self.samples = ColumnStore(os.path.join(path, 'samples'), ROW_DTYPE, UNITS, batch_rows=0)
+        self.links = ColumnStore(os.path.join(path, 'packets'), PACKET_DTYPE, batch_rows=0)
+        self.batch_packets = batch_packets
+        self.packets = self.links.rows
+        self._reconcile()
+        self.fec = FecDecoder()
+        self._frames = []
+        self._times = []
+
+    def _reconcile(self):
+        # an interrupted commit can leave samples of packets that were never committed
+        if self.samples.rows:
+            # rows are stored in packet order
+            keep = int(np.searchsorted(load(self.samples.path, ('packet',))['packet'], self.packets))
+            if keep < self.samples.rows:
+                self.samples.truncate(keep)
+
+    def add(self, frames: list, host_time: float):
+        for packet, rx_tick, rssi, snr in frames:
+            if is_repair(packet):
+                self._queue(packet, rx_tick, rssi, snr, REPAIR, host_time)
+                rebuilt = self.fec.repair(packet)
+                if rebuilt is not None:
+                    self._queue(rebuilt[1], rx_tick, rssi, snr, RECOVERED, host_time)
+            else:
+                seq = packet_seq(packet)
+                if seq is not None:
+                    self.fec.add(packet, seq)
+                self._queue(packet, rx_tick, rssi, snr, DATA, host_time)
+        if len(self._frames) >= self.batch_packets:
+            self.commit()
+
+    def _queue(self, packet, rx_tick, rssi, snr, kind, host_time):
+        self._frames.append((packet, rx_tick, rssi, snr, kind))
+        self._times.append(host_time)
+
+    def commit(self):
+        """decodes the queued frames and writes both tables to disk."""
+        if self._frames:
+            frames = self._frames
+            links = np.empty(len(frames), PACKET_DTYPE)
+            links['packet'] = np.arange(self.packets, self.packets + len(frames))
+            links['host_time'] = self._times
+            links['rx_tick'] = [frame[1] for frame in frames]
+            links['rssi'] = [frame[2] for frame in frames]
+            links['snr'] = [frame[3] for frame in frames]
+            links['length'] = [len(frame[0]) for frame in frames]
+            links['seq'] = [_seq(frame[0]) for frame in frames]
+            links['kind'] = [frame[4] for frame in frames]
+            rows = decode_packets([frame[0] for frame in frames])
+            rows['packet'] += self.packets
+            self.samples.append(rows)
+            self.links.append(links)
+            self.packets += len(frames)
+            self._frames = []
+            self._times = []
+        self.samples.flush()
+        self.links.flush()
+
+    def close(self):
+        self.commit()
+
+
+def _read(stream):
+    # return whatever is available instead of blocking for a full buffer, so live
+    # pipes are committed as they arrive
+    if hasattr(stream, 'read1'):
+        return stream.read1(4096)
+    return stream.read(max(1, getattr(stream, 'in_waiting', 0)))
+
+
+def ingest(stream, session: Session, live: bool, flush_interval: float = 1.0) -> FrameReader:
+    """
+    reads frames from stream into session until the stream ends (or forever when live,
+    where an empty read is only a timeout), committing at least every flush_interval s.
+    """
+    reader = FrameReader()
+    last = time.monotonic()
+    while True:
+        data = _read(stream)
+        if not data and not live:
+            break
+        if data:
+            session.add(reader.feed(data), time.time())
+        now = time.monotonic()
+        if now - last >= flush_interval:
+            session.commit()
+            last = now
+    session.commit()
+    return reader
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--serial', metavar='PORT', help='serial port of the ground receiver')
+    source.add_argument('--file', metavar='PATH', help='recorded bridge stream, - for stdin')
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--batch', type=int, default=256, help='packets decoded per batch')
+    parser.add_argument('--flush', type=float, default=1.0, help='seconds between commits')
+    parser.add_argument('session', help='session directory, appended to if it exists')
+    args = parser.parse_args(argv)
+
+    session = Session(args.session, batch_packets=args.batch)
+    if args.serial:
+        if serial is None:
+            parser.error('--serial needs pyserial (pip install pyserial)')
+        stream = serial.Serial(args.serial, args.baudrate, timeout=0.2)
+        live = True
+    elif args.file == '-':
+        stream = sys.stdin.buffer
+        live = False
+    else:
+        stream = open(args.file, 'rb')
+        live = False
+
+    try:
+        reader = ingest(stream, session, live, args.flush)
+    except KeyboardInterrupt:
+        session.close()
+        reader = None
+    finally:
+        stream.close()
+    print(f'{session.packets} packets, {session.samples.rows} samples in {args.session}')
+    if reader is not None and (reader.skipped or reader.corrupted):
+        print(f'{reader.skipped} bytes skipped, {reader.corrupted} corrupted frames')
+
+
+if __name__ == '__main__':
+    main()
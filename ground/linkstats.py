@@ -0,0 +1,195 @@
+"""
+link statistics of a recorded ground station session (see ground.ingest), to tune the
+telemetry rate and the modem profile from measurements instead of guesses.
+per window of host time:
+    loss      telemetry packets missing from the sequence numbers, on the link and
+              after the fec repairs
+    bursts    the longest run of consecutive lost packets
+    jitter    variation of the transit time between consecutive packets, from the flight
+              tick of each packet and the receiver tick at which it arrived (rfc 3550)
+    rssi/snr  of every packet received
+
+    python -m ground.linkstats session/ --window 10
+"""
+import argparse
+import os
+
+import numpy as np
+
+from ground.ingest import DATA, REPAIR, RECOVERED
+from ground.store import load
+
+TICKS_PERIOD = 1 << 30  # micropython ticks_ms() wraps here
+
+WINDOW_DTYPE = np.dtype([
+    ('start', '<f8'),  # host unix time the window starts at
+    ('received', '<i8'),  # telemetry packets received
+    ('repairs', '<i8'),  # fec repair packets received
+    ('recovered', '<i8'),  # telemetry packets rebuilt from them
+    ('lost', '<i8'),  # telemetry packets missing on the link
+    ('residual', '<i8'),  # still missing after the repairs
+    ('loss', '<f4'),  # lost / sent
+    ('residual_loss', '<f4'),  # residual / sent
+    ('max_burst', '<i8'),  # longest run of consecutive lost packets
+    ('jitter', '<f4'),  # ms, mean transit time variation between consecutive packets
+    ('rssi', '<f4'),  # dBm, mean
+    ('rssi_min', '<i2'),  # dBm
+    ('snr', '<f4'),  # dB, mean
+])
+
+
+def unwrap_seq(seq: np.ndarray) -> np.ndarray:
+    """
+    turns 16-bit sequence numbers in arrival order into a monotonic count, assuming
+    consecutive arrivals are less than half the sequence space apart.
+    """
+    seq = np.asarray(seq, np.int64)
+    if not len(seq):
+        return seq
+    step = (np.diff(seq) + 0x8000) % 0x10000 - 0x8000
+    return seq[0] + np.concatenate(([0], np.cumsum(step)))
+
+
+def ticks_diff(a, b):
+    """a - b for ticks_ms() values, across the wrap."""
+    half = TICKS_PERIOD // 2
+    return (np.asarray(a, np.int64) - b + half) % TICKS_PERIOD - half
+
+
+def newest_ticks(samples: dict, count: int) -> np.ndarray:
+    """
+    flight tick of the newest sample of each of count packets, the closest the telemetry
+    comes to its transmit time; -1 for packets without samples.
+    """
+    ticks = np.full(count, -1, np.int64)
+    packet = np.asarray(samples['packet'])
+    if len(packet):
+        # samples are stored in packet order, oldest first
+        last = np.concatenate((packet[1:] != packet[:-1], [True]))
+        ticks[packet[last]] = np.asarray(samples['tick'])[last]
+    return ticks
+
+
+def _gaps(seq, when):
+    # arrival times of the distinct sequence numbers, and the (arrival time, length) of
+    # every run of missing ones, timed by the packet that ended the run
+    order = np.argsort(seq, kind='stable')
+    seq, when = seq[order], when[order]
+    first = np.concatenate(([True], np.diff(seq) > 0))  # first arrival of duplicates
+    seq, when = seq[first], when[first]
+    gaps = np.diff(seq) - 1
+    ends = gaps > 0
+    return when, when[1:][ends], gaps[ends]
+
+
+def burst_lengths(seq) -> np.ndarray:
+    """lengths of the runs of consecutive sequence numbers missing from seq (16-bit, in arrival order)."""
+    unwrapped = unwrap_seq(seq)
+    return _gaps(unwrapped, np.zeros(len(unwrapped)))[2]
+
+
+def link_stats(packets: dict, samples: dict | None = None, window: float = 10.0) -> np.ndarray:
+    """
+    statistics of the packets table of a session (columns of ground.ingest.PACKET_DTYPE)
+    per window of window seconds of host time, as an array of WINDOW_DTYPE. jitter needs
+    the samples table for the flight ticks and is nan without it.
+    """
+    host_time = np.asarray(packets['host_time'])
+    if not len(host_time):
+        return np.empty(0, WINDOW_DTYPE)
+    kind = np.asarray(packets['kind'])
+    seq = np.asarray(packets['seq'])
+    start = host_time[0]
+    index = ((host_time - start) // window).astype(np.int64)
+    count = int(index.max()) + 1
+
+    def per_window(where, weights=None):
+        return np.bincount(index[where] if where is not None else index,
+                           weights=weights, minlength=count)
+
+    def gap_window(when):
+        return ((when - start) // window).astype(np.int64)
+
+    stats = np.zeros(count, WINDOW_DTYPE)
+    stats['start'] = start + window * np.arange(count)
+    data = (kind == DATA) & (seq >= 0)
+    telemetry = ((kind == DATA) | (kind == RECOVERED)) & (seq >= 0)
+    stats['received'] = per_window(data)
+    stats['repairs'] = per_window(kind == REPAIR)
+    stats['recovered'] = per_window(kind == RECOVERED)
+
+    # one unwrap over everything so link and residual loss count the same numbers
+    unwrapped = np.full(len(seq), -1, np.int64)
+    unwrapped[telemetry] = unwrap_seq(seq[telemetry])
+    arrived, gap_when, gaps = _gaps(unwrapped[data], host_time[data])
+    sent = np.bincount(gap_window(arrived), minlength=count)
+    stats['lost'] = np.bincount(gap_window(gap_when), weights=gaps, minlength=count)
+    np.maximum.at(stats['max_burst'], gap_window(gap_when), gaps)
+    sent += stats['lost']
+    _, gap_when, gaps = _gaps(unwrapped[telemetry], host_time[telemetry])
+    stats['residual'] = np.bincount(gap_window(gap_when), weights=gaps, minlength=count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['loss'] = stats['lost'] / sent
+        stats['residual_loss'] = stats['residual'] / sent
+
+    stats['jitter'] = np.nan
+    if samples is not None:
+        ticks = newest_ticks(samples, len(host_time))
+        timed = np.flatnonzero(data & (ticks >= 0))
+        if len(timed) > 1:
+            # the two clocks' offset cancels in the difference of consecutive transits
+            transit = ticks_diff(np.asarray(packets['rx_tick'])[timed], ticks[timed])
+            variation = np.abs(np.diff(transit)).astype(np.float64)
+            later = index[timed[1:]]
+            pairs = np.bincount(later, minlength=count)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                stats['jitter'] = np.bincount(later, weights=variation, minlength=count) / pairs
+
+    # recovered rows repeat the link fields of their repair packet
+    heard = kind != RECOVERED
+    rssi = np.asarray(packets['rssi'])
+    heard_count = per_window(heard)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['rssi'] = per_window(heard, rssi[heard]) / heard_count
+        stats['snr'] = per_window(heard, np.asarray(packets['snr'])[heard]) / heard_count
+    minimum = np.full(count, np.iinfo(np.int16).max, np.int16)
+    np.minimum.at(minimum, index[heard], rssi[heard])
+    stats['rssi_min'] = np.where(heard_count > 0, minimum, 0)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('session', help='session directory written by ground.ingest')
+    parser.add_argument('--window', type=float, default=10.0, help='seconds per window')
+    args = parser.parse_args(argv)
+
+    packets = load(os.path.join(args.session, 'packets'))
+    samples_path = os.path.join(args.session, 'samples')
+    samples = load(samples_path, ('packet', 'tick')) if os.path.isdir(samples_path) else None
+    stats = link_stats(packets, samples, args.window)
+    if not len(stats):
+        print(f'no packets in {args.session}')
+        return
+
+    print(f"{'t':>7} {'rx':>5} {'fec':>4} {'lost':>5} {'loss':>6} {'after':>6} "
+          f"{'burst':>5} {'jitter':>7} {'rssi':>6} {'min':>4} {'snr':>5}")
+    for row in stats:
+        print(f"{row['start'] - stats['start'][0]:7.0f} {row['received']:5d} {row['recovered']:4d} "
+              f"{row['lost']:5d} {row['loss']:6.1%} {row['residual_loss']:6.1%} "
+              f"{row['max_burst']:5d} {row['jitter']:7.1f} {row['rssi']:6.1f} "
+              f"{row['rssi_min']:4d} {row['snr']:5.1f}")
+
+    lost, residual = stats['lost'].sum(), stats['residual'].sum()
+    sent = stats['received'].sum() + lost
+    print(f"{sent} sent, {lost} lost ({lost / max(sent, 1):.1%}), "
+          f"{residual} after fec ({residual / max(sent, 1):.1%})")
+    bursts = burst_lengths(np.asarray(packets['seq'])[
+        (np.asarray(packets['kind']) == DATA) & (np.asarray(packets['seq']) >= 0)])
+    if len(bursts):
+        histogram = np.bincount(bursts)
+        print('bursts: ' + ', '.join(f'{length}x{n}' for length, n in enumerate(histogram) if n))
+
+
+if __name__ == '__main__':
+    main()
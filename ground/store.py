@@ -0,0 +1,153 @@
+"""
+append-only columnar storage for ground station sessions.
+every field of a structured array is stored as raw little endian values in its own chunk
+files, <field>.<chunk>.bin of up to chunk_rows rows, so each chunk can be memory mapped
+as a plain numpy array. meta.json records the layout and the number of committed rows;
+it is replaced atomically after the column files are written, so a reader never sees a
+row that is not complete in every column and can query a session while it is recorded.
+"""
+import json
+import os
+
+import numpy as np
+
+META = 'meta.json'
+
+
+class ColumnStore:
+    """
+    buffered writer of one columnar table.
+    appended rows are held in memory until batch_rows are pending (or flush() is called),
+    then written to the column files in one go.
+    """
+
+    path: str  # directory of the table
+
+    dtype: np.dtype  # structured layout of a row
+
+    rows: int  # rows committed to disk
+
+    def __init__(self, path: str, dtype: np.dtype, units: dict | None = None,
+                 chunk_rows: int = 1 << 20, batch_rows: int = 4096):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.units = units or {}
+        self.chunk_rows = chunk_rows
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self._pending = []
+        self._pending_rows = 0
+        os.makedirs(path, exist_ok=True)
+        meta = os.path.join(path, META)
+        if os.path.exists(meta):
+            # reopen an interrupted session and keep appending after its committed rows
+            with open(meta) as f:
+                info = json.load(f)
+            if np.dtype([tuple(field) for field in info['fields']]) != self.dtype:
+                raise ValueError(f'{path} holds a table with a different layout')
+            self.chunk_rows = info['chunk_rows']
+            self.rows = info['rows']
+            self._truncate()
+        else:
+            self._write_meta()
+
+    def _file(self, name: str, chunk: int) -> str:
+        return os.path.join(self.path, f'{name}.{chunk:05d}.bin')
+
+    def _truncate(self):
+        # drop values a crash left behind the last committed row, in its chunk and in
+        # any later chunk a multi-chunk flush had started
+        chunk, offset = divmod(self.rows, self.chunk_rows)
+        for name in self.dtype.names:
+            path = self._file(name, chunk)
+            if os.path.exists(path):
+                os.truncate(path, offset * self.dtype[name].itemsize)
+        for entry in os.listdir(self.path):
+            name, _, rest = entry.partition('.')
+            index, _, suffix = rest.partition('.')
+            if (name in self.dtype.names and suffix == 'bin' and index.isdigit()
+                    and int(index) > chunk):
+                os.remove(os.path.join(self.path, entry))
+
+    def truncate(self, rows: int):
+        """drops every row from index rows on, committed or pending."""
+        self._pending = []
+        self._pending_rows = 0
+        self.rows = min(rows, self.rows)
+        self._truncate()
+        self._write_meta()
+
+    def _write_meta(self):
+        info = {
+            'fields': [[name, self.dtype[name].str] for name in self.dtype.names],
+            'units': self.units,
+            'chunk_rows': self.chunk_rows,
+            'rows': self.rows,
+        }
+        tmp = os.path.join(self.path, META + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def append(self, rows: np.ndarray):
+        """queues rows (an array of dtype) and writes them out once batch_rows are pending."""
+        if len(rows):
+            self._pending.append(rows)
+            self._pending_rows += len(rows)
+        if self._pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        """writes every pending row to the column files and commits them in meta.json."""
+        if not self._pending_rows:
+            return
+        rows = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_rows = 0
+        start = 0
+        while start < len(rows):
+            chunk, offset = divmod(self.rows, self.chunk_rows)
+            end = start + min(len(rows) - start, self.chunk_rows - offset)
+            for name in self.dtype.names:
+                with open(self._file(name, chunk), 'ab') as f:
+                    f.write(np.ascontiguousarray(rows[name][start:end]).tobytes())
+            self.rows += end - start
+            start = end
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path: str, fields=None) -> dict:
+    """
+    returns the committed rows of the table at path as {field: array}.
+    single chunk columns are read-only memory maps of the column file, larger ones are
+    concatenated from the memory mapped chunks.
+    """
+    with open(os.path.join(path, META)) as f:
+        info = json.load(f)
+    rows = info['rows']
+    chunk_rows = info['chunk_rows']
+    columns = {}
+    for name, dtype in info['fields']:
+        if fields is not None and name not in fields:
+            continue
+        chunks = []
+        for chunk in range(-(-rows // chunk_rows)):
+            count = min(chunk_rows, rows - chunk * chunk_rows)
+            chunks.append(np.memmap(os.path.join(path, f'{name}.{chunk:05d}.bin'),
+                                    dtype=dtype, mode='r', shape=(count,)))
+        if not chunks:
+            columns[name] = np.empty(0, dtype)
+        elif len(chunks) == 1:
+            columns[name] = chunks[0]
+        else:
+            columns[name] = np.concatenate(chunks)
+    return columns
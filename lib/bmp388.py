@@ -2,7 +2,31 @@
 import time
 from math import pow
 import sys
+from array import array
+
+FIFO_SIZE = 512
+FIFO_FRAME_PRESS_TEMP = 0x94
+FIFO_FRAME_TEMP = 0x90
+FIFO_FRAME_PRESS = 0x84
+FIFO_FRAME_TIME = 0xA0
+FIFO_FRAME_CONFIG_ERROR = 0x44
+FIFO_FRAME_CONFIG_CHANGE = 0x48
+FIFO_MAX_FRAMES = FIFO_SIZE // 7 # Pressure+temperature frames are 7 bytes.
+
 class DFRobot_BMP388:
+  # Output data rates in Hz, indexed by the ODR register value (odr_sel).
+  ODR_HZ = (200, 100, 50, 25, 12.5, 6.25, 3.1, 1.5, 0.78, 0.39, 0.2, 0.1,
+            0.05, 0.02, 0.01, 0.006, 0.003, 0.0015)
+  OSR = (1, 2, 4, 8, 16, 32) # Oversampling factors, indexed by register value.
+  IIR = (0, 1, 3, 7, 15, 31, 63, 127) # IIR filter coefficients, indexed by register value.
+  # Named configurations: (pressure osr, temperature osr, odr Hz, iir coefficient).
+  # Each fits its ODR: measurement time is ~0.6 ms + 2.02 ms per oversampling step.
+  PRESETS = {
+    'pad': (16, 2, 12.5, 7), # Slow, heavily filtered ground reference.
+    'boost': (1, 1, 200, 0), # Maximum rate and no filter lag during ascent.
+    'descent': (4, 1, 50, 3), # Moderate rate with light smoothing under canopy.
+  }
+
   def __init__(self):
     self.op_mode = 0
     self.par_t1 = 0
@@ -19,7 +43,20 @@ class DFRobot_BMP388:
     self.par_p9 = 0
     self.par_p10 = 0
     self.par_p11 = 0
+    self.par_p1_off = 0
     self.addr = 119
+    self._data = bytearray(6) # Reused by every pressure/temperature read.
+    self._fifo_len = bytearray(2)
+    self._fifo_buf = bytearray(FIFO_SIZE + 4) # Room for a trailing sensor time frame.
+    self._fifo_mv = memoryview(self._fifo_buf)
+    self.fifo_time_en = False
+    self.fifo_pressure = array('f', bytearray(4 * FIFO_MAX_FRAMES))
+    self.fifo_temperature = array('f', bytearray(4 * FIFO_MAX_FRAMES))
+    self.fifo_sensortime = 0
+    self.drdy_pin = None
+    self.ring_overruns = 0
+    self._ring_head = 0
+    self._ring_tail = 0
     chip_id = self.bmp3_get_regs(0x00, 1)[0]
     # Print(hex(chip_id))
     if (chip_id != 0x50):
@@ -100,6 +137,10 @@ class DFRobot_BMP388:
     self.par_p11 = (calibTemp)/temp_var 
     # Print(calibTemp)
     
+    # Constant term of the pressure sensitivity polynomial, folded once here
+    # so compensate_pressure only has to evaluate Horner forms per sample.
+    self.par_p1_off = self.par_p1 - 0.000145
+    
   def set_config(self):
     settings_sel = 2|4|16|32|128
     self.bmp3_set_sensor_settings(settings_sel) # Set sensor
@@ -131,8 +172,15 @@ class DFRobot_BMP388:
   def readPressure(self):
     return round(self.bmp3_get_sensor_data(1),2)
 
+  def read_measurement(self):
+    # One burst read of the data registers, returns (pressure Pa, temperature C).
+    rslt = self.bmp3_get_regs_into(0x04,self._data)
+    temperature = self.compensate_temperature(rslt[3]|(rslt[4]<<8)|(rslt[5]<<16))
+    pressure = self.compensate_pressure(rslt[0]|(rslt[1]<<8)|(rslt[2]<<16),temperature)
+    return pressure, temperature
+
   def bmp3_get_sensor_data(self,sensor_comp):
-    rslt = self.bmp3_get_regs(0x04,6)
+    rslt = self.bmp3_get_regs_into(0x04,self._data)
     #parse_sensor_data
     xlsb = rslt[0]
     lsb = rslt[1] << 8
@@ -153,27 +201,20 @@ class DFRobot_BMP388:
     return value
     
   def compensate_temperature(self,uncomp_temperature):
-    uncomp_temp = uncomp_temperature
-    partial_data1 = (uncomp_temp - self.par_t1)
-    partial_data2 = (partial_data1 * self.par_t2)
-    comp_temp = partial_data2 + (partial_data1 * partial_data1)*self.par_t3
-    return comp_temp
+    partial_data1 = (uncomp_temperature - self.par_t1)
+    return partial_data1 * (self.par_t2 + partial_data1 * self.par_t3)
     
   def compensate_pressure(self,uncomp_pressure,t_lin):
-    partial_data1 = self.par_p6 * t_lin
-    partial_data2 = self.par_p7 * pow(t_lin, 2)
-    partial_data3 = self.par_p8 * pow(t_lin, 3)
-    partial_out1 = self.par_p5 + partial_data1 + partial_data2 + partial_data3
-    partial_data1 = self.par_p2 * t_lin
-    partial_data2 = self.par_p3 * pow(t_lin, 2)
-    partial_data3 = self.par_p4 * pow(t_lin, 3)
-    partial_out2 = uncomp_pressure *(self.par_p1-0.000145 +partial_data1+ partial_data2 + partial_data3)
-    partial_data1 = pow(uncomp_pressure, 2)
-    partial_data2 = self.par_p9 + self.par_p10 * t_lin
-    partial_data3 = partial_data1 * partial_data2
-    partial_data4 = partial_data3 + pow(uncomp_pressure, 3) * self.par_p11
-    comp_press = partial_out1 + partial_out2 + partial_data4
-    return comp_press;
+    # Same polynomials as the Bosch reference, evaluated in Horner form:
+    # out1 = p5 + p6*t + p7*t^2 + p8*t^3
+    # out2 = u * (p1 - 0.000145 + p2*t + p3*t^2 + p4*t^3)
+    # out3 = u^2 * (p9 + p10*t) + u^3 * p11
+    t = t_lin
+    u = uncomp_pressure
+    partial_out1 = self.par_p5 + t * (self.par_p6 + t * (self.par_p7 + t * self.par_p8))
+    partial_out2 = self.par_p1_off + t * (self.par_p2 + t * (self.par_p3 + t * self.par_p4))
+    partial_out3 = self.par_p9 + t * self.par_p10 + u * self.par_p11
+    return partial_out1 + u * (partial_out2 + u * partial_out3)
     
   def readCalibratedAltitude(self,seaLevel):
     pressure = self.readPressure()
@@ -187,6 +228,189 @@ class DFRobot_BMP388:
     pressure = self.readPressure()
     return round((1.0 - pow(pressure / 101325, 0.190284)) * 287.15 / 0.0065,2)
   
+  def configure(self,osr_p=1,osr_t=1,odr=50,iir=0):
+    # Oversampling, output data rate and IIR filter. The sensor is put to
+    # sleep while the settings change and returned to normal mode after.
+    try:
+      osr = self.OSR.index(osr_p)|(self.OSR.index(osr_t)<<3)
+      iir_sel = self.IIR.index(iir)
+    except ValueError:
+      raise ValueError('Illegal oversampling {}/{} or IIR coefficient {}'.format(osr_p,osr_t,iir))
+    self.op_mode = 0x00
+    self.write_power_mode()
+    data = bytearray(1)
+    data[0] = osr
+    self.bmp3_set_regs(0x1c,data)
+    data[0] = iir_sel<<1
+    self.bmp3_set_regs(0x1f,data)
+    rate = self.set_odr(odr)
+    self.op_mode = 0x03
+    self.write_power_mode()
+    return rate
+
+  def apply_preset(self,name):
+    try:
+      preset = self.PRESETS[name]
+    except KeyError:
+      raise ValueError('Unknown preset: {}'.format(name))
+    return self.configure(*preset)
+
+  def data_ready(self):
+    # True when a pressure sample newer than the last read is available.
+    return bool(self.bmp3_get_regs_into(0x03,self._fifo_len)[0] & 0x20) # STATUS drdy_press
+
+  def set_odr(self,hz):
+    # Select the slowest output data rate that is at least hz. Rates above
+    # 100 Hz require x1 pressure and temperature oversampling.
+    odr_sel = 0
+    for i in range(len(self.ODR_HZ)):
+      if self.ODR_HZ[i] >= hz:
+        odr_sel = i
+    data = bytearray(1)
+    data[0] = odr_sel
+    self.bmp3_set_regs(0x1d,data)
+    return self.ODR_HZ[odr_sel]
+
+  def configure_fifo(self,watermark_frames=0,stop_on_full=False,time_en=False,wtm_int=False):
+    # Buffer filtered pressure+temperature frames in the on-chip FIFO.
+    # The watermark is given in pressure+temperature frames (7 bytes each).
+    self.fifo_time_en = time_en
+    data = bytearray(1)
+    data[0] = 0x01|(0x02 if stop_on_full else 0)|(0x04 if time_en else 0)|0x08|0x10
+    self.bmp3_set_regs(0x17,data) # FIFO_CONFIG_1: mode, stop_on_full, time, press, temp
+    data[0] = 0x08
+    self.bmp3_set_regs(0x18,data) # FIFO_CONFIG_2: no subsampling, filtered data
+    wtm = min(watermark_frames * 7, FIFO_SIZE - 1)
+    wtm_data = bytearray(2)
+    wtm_data[0] = wtm & 0xff
+    wtm_data[1] = (wtm >> 8) & 0x01
+    self.bmp3_set_regs(0x15,wtm_data)
+    if wtm_int:
+      reg_data = self.bmp3_get_regs_into(0x19,bytearray(1))
+      reg_data[0] |= 0x08 # fwtm_en
+      self.bmp3_set_regs(0x19,reg_data)
+    self.flush_fifo()
+
+  def flush_fifo(self):
+    data = bytearray(1)
+    data[0] = 0xb0
+    self.bmp3_set_regs(0x7e,data)
+
+  def fifo_length(self):
+    rslt = self.bmp3_get_regs_into(0x12,self._fifo_len)
+    return (rslt[0]|(rslt[1]<<8)) & 0x1ff
+
+  def drain_fifo(self):
+    # Read every buffered frame in one burst and compensate them in a batch
+    # into fifo_pressure / fifo_temperature. Returns the number of samples.
+    length = self.fifo_length()
+    if length == 0:
+      return 0
+    if self.fifo_time_en:
+      length += 4 # The sensor time frame is only sent after the last data frame.
+    buf = self._fifo_buf
+    self.bmp3_get_regs_into(0x14,self._fifo_mv[:length])
+    press = self.fifo_pressure
+    temp = self.fifo_temperature
+    t_lin = temp[0]
+    count = 0
+    i = 0
+    while i < length:
+      header = buf[i]
+      if header == FIFO_FRAME_PRESS_TEMP:
+        if i + 7 > length:
+          break
+        # Temperature comes first in the frame, followed by pressure.
+        t_lin = self.compensate_temperature(buf[i+1]|(buf[i+2]<<8)|(buf[i+3]<<16))
+        temp[count] = t_lin
+        press[count] = self.compensate_pressure(buf[i+4]|(buf[i+5]<<8)|(buf[i+6]<<16),t_lin)
+        count += 1
+        i += 7
+      elif header == FIFO_FRAME_TEMP:
+        t_lin = self.compensate_temperature(buf[i+1]|(buf[i+2]<<8)|(buf[i+3]<<16))
+        i += 4
+      elif header == FIFO_FRAME_PRESS:
+        temp[count] = t_lin
+        press[count] = self.compensate_pressure(buf[i+1]|(buf[i+2]<<8)|(buf[i+3]<<16),t_lin)
+        count += 1
+        i += 4
+      elif header == FIFO_FRAME_TIME:
+        self.fifo_sensortime = buf[i+1]|(buf[i+2]<<8)|(buf[i+3]<<16)
+        i += 4
+      elif header == FIFO_FRAME_CONFIG_CHANGE or header == FIFO_FRAME_CONFIG_ERROR:
+        i += 2
+      else: # Empty frame (0x80) or end of valid data.
+        break
+      if count == FIFO_MAX_FRAMES:
+        break
+    return count
+
+  def attach_drdy(self,pin,depth=32):
+    # Sample on the data-ready interrupt: the handler timestamps each reading
+    # and stores it raw in a ring buffer; read_samples compensates later.
+    # While attached, only read pressure/temperature through read_samples.
+    self._ring_depth = depth
+    self._ring_head = 0
+    self._ring_tail = 0
+    self.ring_overruns = 0
+    self._ring_data = bytearray(6)
+    self.ring_ticks = array('i', bytearray(4 * depth))
+    self.ring_up = array('i', bytearray(4 * depth))
+    self.ring_ut = array('i', bytearray(4 * depth))
+    # Read-modify-write INT_CTRL so a FIFO watermark interrupt set up by
+    # configure_fifo stays enabled
+    reg_data = self.bmp3_get_regs_into(0x19,bytearray(1))
+    reg_data[0] = (reg_data[0] & ~0x01) | 0x42 # push-pull, active high, drdy_en
+    self.bmp3_set_regs(0x19,reg_data)
+    self.drdy_pin = pin
+    pin.irq(trigger=pin.IRQ_RISING, handler=self._drdy_handler)
+
+  def detach_drdy(self):
+    if self.drdy_pin is not None:
+      self.drdy_pin.irq(handler=None)
+      self.drdy_pin = None
+    reg_data = self.bmp3_get_regs_into(0x19,bytearray(1))
+    reg_data[0] &= ~0x40 # drdy_en only, keep fwtm_en
+    self.bmp3_set_regs(0x19,reg_data)
+
+  def _drdy_handler(self,pin):
+    # Single producer: only the head index is written here. When the ring is
+    # full the new sample is dropped and counted rather than moving the tail.
+    ticks = time.ticks_us()
+    head = self._ring_head
+    nxt = head + 1
+    if nxt == self._ring_depth:
+      nxt = 0
+    if nxt == self._ring_tail:
+      self.ring_overruns += 1
+      return
+    d = self.bmp3_get_regs_into(0x04,self._ring_data)
+    self.ring_ticks[head] = ticks
+    self.ring_up[head] = d[0]|(d[1]<<8)|(d[2]<<16)
+    self.ring_ut[head] = d[3]|(d[4]<<8)|(d[5]<<16)
+    self._ring_head = nxt
+
+  def samples_available(self):
+    return (self._ring_head - self._ring_tail) % self._ring_depth if self.drdy_pin else 0
+
+  def read_samples(self,pressure,temperature,ticks):
+    # Compensate queued data-ready samples into the caller's arrays, oldest
+    # first. Returns the number of samples written.
+    n = 0
+    tail = self._ring_tail
+    limit = min(len(pressure),len(temperature),len(ticks))
+    while tail != self._ring_head and n < limit:
+      t_lin = self.compensate_temperature(self.ring_ut[tail])
+      temperature[n] = t_lin
+      pressure[n] = self.compensate_pressure(self.ring_up[tail],t_lin)
+      ticks[n] = self.ring_ticks[tail]
+      n += 1
+      tail += 1
+      if tail == self._ring_depth:
+        tail = 0
+    self._ring_tail = tail
+    return n
+
   def INTEnable(self):
     reg_data = bytearray(1)
     reg_data[0] = 0x40;
@@ -202,19 +426,21 @@ class DFRobot_BMP388_SPI(DFRobot_BMP388):
   def __init__(self,spi,cs):
     self.spi = spi
     self.cs = cs    
+    self._reg = bytearray(1)
+    self._dummy = bytearray(1)
     super(DFRobot_BMP388_SPI,self).__init__()
 
   def bmp3_get_regs(self,reg,len):
-    regAddr = bytearray(1)
-    regAddr[0] = reg|0x80
+    return self.bmp3_get_regs_into(reg,bytearray(len))
+
+  def bmp3_get_regs_into(self,reg,buf):
+    self._reg[0] = reg|0x80
     self.cs.value(0)
-    self.spi.write(regAddr)
-    rslt = self.spi.read(len+1)
+    self.spi.write(self._reg)
+    self.spi.readinto(self._dummy) # SPI reads start with one dummy byte
+    self.spi.readinto(buf)
     self.cs.value(1)
-    data = bytearray(len)
-    for i in range(0,len):
-      data[i] = rslt[i+1]
-    return data
+    return buf
   
   def bmp3_set_regs(self,reg,data):
     regAddr = bytearray(1)
@@ -233,5 +459,9 @@ class DFRobot_BMP388_I2C(DFRobot_BMP388):
     rslt = self.i2c.readfrom_mem(self.addr,reg,len)
     return rslt
 
+  def bmp3_get_regs_into(self,reg,buf):
+    self.i2c.readfrom_mem_into(self.addr,reg,buf)
+    return buf
+
   def bmp3_set_regs(self,reg,data):
     self.i2c.writeto_mem(self.addr,reg,data)
@@ -30,8 +30,9 @@
 # Ported to MicroPython and extended by Peter Hinch
 # This port copyright (c) Peter Hinch 2019
 
+from array import array
 from micropython import const
-from bno055_base import BNO055_BASE
+from bno055_base import BNO055_BASE, ACCEL_SCALE, MAG_SCALE, GYRO_SCALE, EULER_SCALE, QUAT_SCALE
 
 
 CONFIG_MODE = 0x00
@@ -64,6 +65,28 @@ _PAGE_REGISTER = const(0x07)
 _AXIS_MAP_SIGN = const(0x42)
 _AXIS_MAP_CONFIG = const(0x41)
 
+# Contiguous block covering every data register from ACC_DATA up to the end
+# of GRAV_DATA (0x08-0x33). Reading it in one transaction guarantees that all
+# vectors come from the same fusion cycle.
+_BURST_START = const(0x08)
+_BURST_LEN = const(0x2c)
+
+
+# Reusable container for BNO055.read_all(). Each vector is an array('f') in the
+# same units and order as the corresponding scaled_tuple accessor; raw holds the
+# undecoded register block (little endian int16 values).
+class BNO055Sample:
+
+    def __init__(self):
+        self.raw = bytearray(_BURST_LEN)
+        self.accel = array('f', (0, 0, 0))  # m.s^-2
+        self.mag = array('f', (0, 0, 0))  # microteslas
+        self.gyro = array('f', (0, 0, 0))  # deg.s^-1
+        self.euler = array('f', (0, 0, 0))  # degrees (heading, roll, pitch)
+        self.quaternion = array('f', (0, 0, 0, 0))  # (w, x, y, z)
+        self.lin_acc = array('f', (0, 0, 0))  # m.s^-2
+        self.gravity = array('f', (0, 0, 0))  # m.s^-2
+
 class BNO055(BNO055_BASE):
 
     acc_range = (2, 4, 8, 16)  # G
@@ -127,6 +150,7 @@ class BNO055(BNO055_BASE):
         super().__init__(i2c, address, crystal)
         self.buf6 = bytearray(6)
         self.buf8 = bytearray(8)
+        self.sample = BNO055Sample()
         self.w = 0
         self.x = 0
         self.y = 0
@@ -174,4 +198,29 @@ class BNO055(BNO055_BASE):
             i = 0
         self.x = self._bytes_toint(buf[i], buf[i+1])
         self.y = self._bytes_toint(buf[i+2], buf[i+3])
-        self.z = self._bytes_toint(buf[i+4], buf[i+5])
\ No newline at end of file
+        self.z = self._bytes_toint(buf[i+4], buf[i+5])
+
+    # For use in ISR: read every data register (0x08-0x33) into a 44 byte buffer.
+    # Passing a preallocated memoryview slot of an array('h') stores the 22 raw
+    # signed values (accel, mag, gyro, euler, quaternion, lin_acc, gravity)
+    # without decoding, as the chip and the supported ports are little endian.
+    def iget_block(self, buf):
+        self._i2c.readfrom_mem_into(self.address, _BURST_START, buf)
+
+    # Read every data register in a single I2C transaction and decode into a
+    # BNO055Sample. If no sample is passed the instance's own one is reused, so
+    # the returned object is overwritten by the next call.
+    def read_all(self, sample=None):
+        if sample is None:
+            sample = self.sample
+        buf = sample.raw
+        self._i2c.readfrom_mem_into(self.address, _BURST_START, buf)
+        sc = self._scale_into
+        sc(buf, ACC_DATA - _BURST_START, sample.accel, ACCEL_SCALE)
+        sc(buf, MAG_DATA - _BURST_START, sample.mag, MAG_SCALE)
+        sc(buf, GYRO_DATA - _BURST_START, sample.gyro, GYRO_SCALE)
+        sc(buf, EULER_DATA - _BURST_START, sample.euler, EULER_SCALE)
+        sc(buf, QUAT_DATA - _BURST_START, sample.quaternion, QUAT_SCALE)
+        sc(buf, LIN_ACC_DATA - _BURST_START, sample.lin_acc, ACCEL_SCALE)
+        sc(buf, GRAV_DATA - _BURST_START, sample.gravity, ACCEL_SCALE)
+        return sample
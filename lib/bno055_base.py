@@ -76,19 +76,44 @@ ACCEL_RADIUS_MSB_ADDR = const(0x68)
 MAG_RADIUS_LSB_ADDR = const(0x69)
 MAG_RADIUS_MSB_ADDR = const(0x6A)
 
+# Scale factors from raw register counts to engineering units. MicroPython
+# does not fold float division at compile time, so they are built once here
+# rather than on every read.
+ACCEL_SCALE = 1 / 100  # m.s^-2 (accel, lin_acc, gravity)
+MAG_SCALE = 1 / 16  # microteslas
+GYRO_SCALE = 1 / 16  # deg.s^-1
+EULER_SCALE = 1 / 16  # degrees
+QUAT_SCALE = 1 / (1 << 14)  # unit quaternion
+
 class BNO055_BASE:
 
     def __init__(self, i2c, address=0x28, crystal=True, transpose=(0, 1, 2), sign=(0, 0, 0)):
         self._i2c = i2c
         self.address = address
         self.crystal = crystal
-        self.mag = lambda : self.scaled_tuple(0x0e, 1/16)  # microteslas (x, y, z)
-        self.accel = lambda : self.scaled_tuple(0x08, 1/100)  # m.s^-2
-        self.lin_acc = lambda : self.scaled_tuple(0x28, 1/100)  # m.s^-2
-        self.gravity = lambda : self.scaled_tuple(0x2e, 1/100)  # m.s^-2
-        self.gyro = lambda : self.scaled_tuple(0x14, 1/16)  # deg.s^-1
-        self.euler = lambda : self.scaled_tuple(0x1a, 1/16)  # degrees (heading, roll, pitch)
-        self.quaternion = lambda : self.scaled_tuple(0x20, 1/(1<<14), bytearray(8), '<hhhh')  # (w, x, y, z)
+        self.mag = lambda : self.scaled_tuple(0x0e, MAG_SCALE)  # microteslas (x, y, z)
+        self.accel = lambda : self.scaled_tuple(0x08, ACCEL_SCALE)  # m.s^-2
+        self.lin_acc = lambda : self.scaled_tuple(0x28, ACCEL_SCALE)  # m.s^-2
+        self.gravity = lambda : self.scaled_tuple(0x2e, ACCEL_SCALE)  # m.s^-2
+        self.gyro = lambda : self.scaled_tuple(0x14, GYRO_SCALE)  # deg.s^-1
+        self.euler = lambda : self.scaled_tuple(0x1a, EULER_SCALE)  # degrees (heading, roll, pitch)
+        self.quaternion = lambda : self.scaled_tuple(0x20, QUAT_SCALE, self._buf8, '<hhhh')  # (w, x, y, z)
+        # Buffer reusing variants: write scaled values into a caller supplied
+        # array('f') of length 3 (4 for quaternion) and return it. No tuple or
+        # list is built, but on ports that box floats (e.g. rp2) each scaled
+        # component is still a short lived heap float. Use raw_into() where
+        # nothing may be allocated and scale later.
+        self.mag_into = lambda dest : self.scaled_into(0x0e, MAG_SCALE, dest)
+        self.accel_into = lambda dest : self.scaled_into(0x08, ACCEL_SCALE, dest)
+        self.lin_acc_into = lambda dest : self.scaled_into(0x28, ACCEL_SCALE, dest)
+        self.gravity_into = lambda dest : self.scaled_into(0x2e, ACCEL_SCALE, dest)
+        self.gyro_into = lambda dest : self.scaled_into(0x14, GYRO_SCALE, dest)
+        self.euler_into = lambda dest : self.scaled_into(0x1a, EULER_SCALE, dest)
+        self.quaternion_into = lambda dest : self.scaled_into(0x20, QUAT_SCALE, dest)
+        # Per-instance read buffers: a shared default argument would alias
+        # reads across vectors and instances.
+        self._buf6 = bytearray(6)
+        self._buf8 = bytearray(8)
         self._mode = _CONFIG_MODE
         try:
             chip_id = self._read(_ID_REGISTER)
@@ -114,9 +139,37 @@ class BNO055_BASE:
             self.orient()  # Subclass
         self.mode(_NDOF_MODE)
 
-    def scaled_tuple(self, addr, scale, buf=bytearray(6), fmt='<hhh'):
+    def scaled_tuple(self, addr, scale, buf=None, fmt='<hhh'):
+        if buf is None:
+            buf = self._buf6
         return tuple(b*scale for b in ustruct.unpack(fmt, self._readn(buf, addr)))
 
+    def scaled_into(self, addr, scale, dest):
+        buf = self._buf8 if len(dest) == 4 else self._buf6
+        self._scale_into(self._readn(buf, addr), 0, dest, scale)
+        return dest
+
+    # Raw signed register counts of the vector at addr into dest, an
+    # array('h') of length 3 (4 for quaternion at 0x20), without allocating.
+    # Multiply by the matching *_SCALE for engineering units.
+    def raw_into(self, addr, dest):
+        buf = self._buf8 if len(dest) == 4 else self._buf6
+        self._readn(buf, addr)
+        for i in range(len(dest)):
+            v = buf[2 * i] | (buf[2 * i + 1] << 8)
+            dest[i] = v - 0x10000 if v & 0x8000 else v
+        return dest
+
+    # Decode len(dest) little endian int16 values starting at offset, scaled.
+    @staticmethod
+    def _scale_into(buf, offset, dest, scale):
+        for i in range(len(dest)):
+            v = buf[offset] | (buf[offset + 1] << 8)
+            if v & 0x8000:
+                v -= 0x10000
+            dest[i] = v * scale
+            offset += 2
+
     def temperature(self):
         t = self._read(0x34)  # Celcius signed (corrected from Adafruit)
         return t if t < 128 else t - 256
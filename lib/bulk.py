@@ -0,0 +1,388 @@
+# Reliable bulk transfer over the LoRa link, for pulling the flight log off the
+# rocket after landing. Pure Python, runs on MicroPython and on CPython (see
+# ground/bulksim.py).
+#
+# Selective repeat with a sliding window: the sender keeps up to window chunks
+# in flight, the receiver writes every chunk straight to its offset in the
+# sink, and acknowledges with the next expected chunk plus a bitmap of the 32
+# chunks after it. The link is half duplex, so the receiver only answers
+# packets flagged POLL, which the sender sets on the last packet before it has
+# to wait. Retransmission timeouts follow the measured round trip time
+# (RFC 6298), and a transfer can resume from any byte offset.
+#
+#   request  <BBI   REQUEST, transfer id, byte offset to start from
+#   data     <BBHB  DATA, transfer id, chunk number from the offset, flags,
+#                   then up to CHUNK bytes
+#   ack      <BBHHI ACK, transfer id, next expected chunk, chunk whose POLL
+#                   triggered this ack, bitmap of received chunks after it
+#
+# Packet types share the 0xF0 and up range lib.telemetry reserves for non
+# telemetry packets.
+import struct
+from array import array
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:  # CPython
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+REQUEST = 0xF2
+DATA = 0xF3
+ACK = 0xF4
+
+REQUEST_FORMAT = "<BBI"
+DATA_FORMAT = "<BBHB"
+ACK_FORMAT = "<BBHHI"
+REQUEST_SIZE = struct.calcsize(REQUEST_FORMAT)
+DATA_SIZE = struct.calcsize(DATA_FORMAT)
+ACK_SIZE = struct.calcsize(ACK_FORMAT)
+
+CHUNK = 240  # data bytes per packet, fits RFM9x.tx_payload with the header
+MAX_CHUNKS = 0xFFFF  # per request, the receiver asks again for the rest
+
+# DATA flags
+POLL = 0x01  # acknowledge now, the sender waits for it
+LAST = 0x02  # last chunk of this request
+EOF = 0x04  # and of the whole source
+
+# slot states
+_FREE = 0
+_SENT = 1
+_LOST = 2
+_ACKED = 3
+
+_RTO_MIN = 50
+_RTO_MAX = 8000
+
+
+class BulkSender:
+    """Sending side of a transfer, driven by the caller: on_packet() for each
+    received packet, next_packet() whenever the radio is free to transmit, and
+    when it returns 0, wait up to wait_ms() for an answer.
+    source is a file object with seek() and readinto(), size its length. rto
+    is the timeout in ms until the round trip time has been measured, it must
+    cover the time on air of a data packet and an ACK.
+    """
+
+    def __init__(self, source, size, window=16, rto=1000):
+        assert 0 < window <= 32
+        self.source = source
+        self.size = size
+        self.window = window
+        self.srtt = 0
+        """Smoothed round trip time in ms, 0 until measured."""
+        self.rttvar = 0
+        self.rto = rto
+        """Retransmission timeout in ms."""
+        self.retransmissions = 0
+        self.active = False
+        """True from a request until every chunk of it is acknowledged."""
+        self._state = bytearray(window)
+        self._sent_at = array("i", bytearray(4 * window))
+        self._serial = array("I", bytearray(4 * window))
+        self._tries = bytearray(window)
+        self._id = 0
+        self._offset = 0
+        self._chunks = 0
+        self._base = 0  # oldest unacknowledged chunk
+        self._next = 0  # first chunk never sent
+        self._sends = 0  # transmissions so far, orders the chunks in flight
+        self._poll_at = None  # ticks of the last POLL, None when not waiting
+
+    def _start(self, transfer, offset, now):
+        self._id = transfer
+        self._offset = min(offset, self.size)
+        remaining = self.size - self._offset
+        self._chunks = max(1, min(MAX_CHUNKS, -(-remaining // CHUNK)))
+        self._base = 0
+        self._next = 0
+        self._poll_at = None
+        for i in range(self.window):
+            self._state[i] = _FREE
+        self.active = True
+
+    def on_packet(self, packet, now):
+        """Process a received REQUEST or ACK; other packets are ignored."""
+        kind = packet[0] if len(packet) else None
+        if kind == REQUEST and len(packet) >= REQUEST_SIZE:
+            _, transfer, offset = struct.unpack_from(REQUEST_FORMAT, packet, 0)
+            if not self.active or transfer != self._id:
+                self._start(transfer, offset, now)
+            return
+        if kind != ACK or len(packet) < ACK_SIZE or not self.active:
+            return
+        _, transfer, expected, echo, bitmap = struct.unpack_from(ACK_FORMAT, packet, 0)
+        if transfer != self._id:
+            return
+        # A late or duplicate ack polled by a chunk that has since been acked
+        # only acknowledges: its slot holds a newer chunk, and the poll being
+        # waited for is still to be answered.
+        current = self._base <= echo < self._next
+        poll_serial = 0
+        if current:
+            self._poll_at = None
+            slot = echo % self.window
+            if self._tries[slot] == 1:
+                # Karn: only chunks sent once give an unambiguous sample
+                self._sample(ticks_diff(now, self._sent_at[slot]))
+            elif self.srtt:
+                # the link answers again, drop the backoff
+                self._update_rto()
+            poll_serial = self._serial[slot]
+        for seq in range(self._base, self._next):
+            slot = seq % self.window
+            if seq < expected or (
+                seq > expected and bitmap >> (seq - expected - 1) & 1
+            ):
+                self._state[slot] = _ACKED
+            elif current and self._state[slot] == _SENT and self._serial[slot] <= poll_serial:
+                # sent before the poll and missing from its ack, so lost
+                self._state[slot] = _LOST
+        while self._base < self._next and self._state[self._base % self.window] == _ACKED:
+            self._state[self._base % self.window] = _FREE
+            self._base += 1
+        if self._base == self._chunks:
+            self.active = False
+
+    def _sample(self, rtt):
+        if self.srtt == 0:
+            self.srtt = rtt
+            self.rttvar = rtt // 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) // 4
+            self.srtt += (rtt - self.srtt) // 8
+        self._update_rto()
+
+    def _update_rto(self):
+        self.rto = min(max(self.srtt + max(4 * self.rttvar, 10), _RTO_MIN), _RTO_MAX)
+
+    def wait_ms(self, now):
+        """Time in ms to listen for an ACK before next_packet() retransmits."""
+        if self._poll_at is None:
+            return 0
+        return max(0, self.rto - ticks_diff(now, self._poll_at))
+
+    def next_packet(self, buf, now):
+        """Write the next packet to transmit into buf.
+
+           Returns: its length, 0 if the sender is idle or waiting for an ACK.
+        """
+        if not self.active:
+            return 0
+        if self._poll_at is not None:
+            if ticks_diff(now, self._poll_at) < self.rto:
+                return 0
+            # no ack: back off and resend the oldest chunk to solicit one
+            self.rto = min(2 * self.rto, _RTO_MAX)
+            self._poll_at = None
+            seq = self._base
+        else:
+            seq = self._lost()
+            if seq is None:
+                if self._next < self._chunks and self._next < self._base + self.window:
+                    seq = self._next
+                    self._next += 1
+                else:
+                    seq = self._base  # nothing new may be sent, just poll
+        length = self._data_into(buf, seq, now)
+        if self._lost() is None and (
+            self._next == self._chunks or self._next == self._base + self.window
+        ):
+            buf[4] |= POLL
+            self._poll_at = now
+        return length
+
+    def _lost(self):
+        for seq in range(self._base, self._next):
+            if self._state[seq % self.window] == _LOST:
+                return seq
+        return None
+
+    def _data_into(self, buf, seq, now):
+        slot = seq % self.window
+        if self._state[slot] == _FREE:
+            self._tries[slot] = 0
+        elif self._state[slot] != _ACKED:
+            self.retransmissions += 1
+        if self._tries[slot] < 255:
+            self._tries[slot] += 1
+        if self._state[slot] != _ACKED:
+            self._state[slot] = _SENT
+        self._sent_at[slot] = now
+        self._serial[slot] = self._sends
+        self._sends += 1
+        start = self._offset + seq * CHUNK
+        length = min(CHUNK, self.size - start)
+        flags = 0
+        if seq == self._chunks - 1:
+            flags = LAST
+            if start + length == self.size:
+                flags |= EOF
+        struct.pack_into(DATA_FORMAT, buf, 0, DATA, self._id, seq, flags)
+        if length:
+            self.source.seek(start)
+            self.source.readinto(memoryview(buf)[DATA_SIZE:DATA_SIZE + length])
+        return DATA_SIZE + length
+
+
+class BulkReceiver:
+    """Receiving side of a transfer. sink is a file object opened for random
+    access writes; offset is where to resume, the length of what is already
+    there. Send request_into() until data arrives, feed every packet to
+    on_packet() and send back the ACK it writes.
+    """
+
+    def __init__(self, sink, offset=0, transfer=0):
+        self.sink = sink
+        self.offset = offset
+        """Bytes of the source received contiguously from its start."""
+        self.done = False
+        """True once the whole source up to its end has been received."""
+        self.transfer = transfer
+        """Id of the current request, the sender restarts when it changes."""
+        self.packets = 0
+        """DATA packets received for the current request."""
+        self._base = offset
+        self._expected = 0
+        self._bitmap = 0
+        self._last = None  # number of chunks in this request, once known
+        self._eof = False
+
+    def request_into(self, buf):
+        """Write a request for everything from offset on into buf.
+
+           Returns: its length.
+        """
+        if self.packets:
+            self.transfer = (self.transfer + 1) & 0xFF
+        self.packets = 0
+        self._base = self.offset
+        self._expected = 0
+        self._bitmap = 0
+        self._last = None
+        struct.pack_into(REQUEST_FORMAT, buf, 0, REQUEST, self.transfer, self.offset)
+        return REQUEST_SIZE
+
+    def on_packet(self, packet, buf):
+        """Store a DATA packet of the current request.
+
+           Returns: the length of the ACK written into buf, 0 if none is due.
+        """
+        if len(packet) < DATA_SIZE or packet[0] != DATA:
+            return 0
+        _, transfer, seq, flags = struct.unpack_from(DATA_FORMAT, packet, 0)
+        if transfer != self.transfer:
+            return 0
+        self.packets += 1
+        if flags & LAST:
+            self._last = seq + 1
+            self._eof = bool(flags & EOF)
+        if seq >= self._expected and not (
+            seq > self._expected and self._bitmap >> (seq - self._expected - 1) & 1
+        ):
+            if seq - self._expected <= 32:
+                self.sink.seek(self._base + seq * CHUNK)
+                self.sink.write(packet[DATA_SIZE:])
+                if seq == self._expected:
+                    self._advance(len(packet) - DATA_SIZE)
+                else:
+                    self._bitmap |= 1 << (seq - self._expected - 1)
+        if not flags & POLL:
+            return 0
+        struct.pack_into(ACK_FORMAT, buf, 0, ACK, self.transfer, self._expected, seq, self._bitmap)
+        return ACK_SIZE
+
+    def _advance(self, length):
+        # the next expected chunk arrived; slide over it and every chunk after
+        # it that was already stored
+        self._expected += 1
+        self.offset = self._base + (self._expected - 1) * CHUNK + length
+        while self._bitmap & 1:
+            self._bitmap >>= 1
+            self._expected += 1
+            self.offset = self._base + self._expected * CHUNK
+        self._bitmap >>= 1
+        if self._last is not None and self._expected >= self._last:
+            # only the final chunk may be short, the size comes from the sink
+            self.sink.seek(0, 2)
+            self.offset = self.sink.tell()
+            self.done = self._eof
+
+    @property
+    def complete(self):
+        """True when the current request has been fully received."""
+        return self._last is not None and self._expected >= self._last
+
+
+async def serve(radio, source, size, *, window=16, rto=1000, idle_ms=60000, clock=ticks_ms):
+    """Answer log requests over radio (an RFM9x in continuous receive mode)
+    until no request or ACK arrived for idle_ms.
+    """
+    sender = BulkSender(source, size, window, rto)
+    rx = bytearray(252)
+    idle = clock()
+    while True:
+        now = clock()
+        length = sender.next_packet(radio.tx_payload, now)
+        if length:
+            await radio.send_payload_async(length, keep_listening=True)
+            continue
+        timeout = sender.wait_ms(now) if sender.active else 1000
+        n = await radio.receive_async(rx, timeout=max(1, timeout))
+        now = clock()
+        if n:
+            sender.on_packet(memoryview(rx)[:n], now)
+            idle = now
+        elif ticks_diff(now, idle) > idle_ms:
+            return sender
+
+
+async def fetch(radio, sink, offset=0, *, request_ms=1000, idle_ms=30000, clock=ticks_ms):
+    """Download the log into sink (opened for random access writes) from
+    offset on, over radio (an RFM9x in continuous receive mode). Gives up after
+    idle_ms without data, a later call with the new offset resumes.
+    The request is repeated while nothing is heard for request_ms, which must
+    exceed the time on air of a data packet.
+    clock returns the time in ms, the simulation substitutes its own.
+
+       Returns: the BulkReceiver, its done and offset tell how far it got.
+    """
+    # a fresh id, so a sender still busy with an abandoned request restarts
+    receiver = BulkReceiver(sink, offset, clock() & 0xFF)
+    rx = bytearray(252)
+    idle = clock()
+    requested = False
+    while not receiver.done:
+        if not requested or receiver.complete:
+            await radio.send_payload_async(receiver.request_into(radio.tx_payload), keep_listening=True)
+            requested = True
+        n = await radio.receive_async(rx, timeout=request_ms)
+        now = clock()
+        if n:
+            await _answer(radio, receiver, rx, n)
+            idle = now
+        elif ticks_diff(now, idle) > idle_ms:
+            return receiver
+        elif not receiver.packets:
+            requested = False  # the request or all the first data was lost, ask again
+    # keep acknowledging until the sender stops polling, in case the last ack
+    # was lost; the sender backs off between polls, so wait longer each time
+    linger = 4 * request_ms
+    while True:
+        n = await radio.receive_async(rx, timeout=linger)
+        if not n:
+            return receiver
+        await _answer(radio, receiver, rx, n)
+        linger = min(2 * linger, idle_ms)
+
+
+async def _answer(radio, receiver, rx, n):
+    length = receiver.on_packet(memoryview(rx)[:n], radio.tx_payload)
+    if length:
+        await radio.send_payload_async(length, keep_listening=True)
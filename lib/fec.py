@@ -0,0 +1,145 @@
+# Packet level forward error correction for the telemetry downlink.
+# Pure Python, shared by the flight computer and the ground station.
+#
+# Data packets are sent unchanged. After every group of k of them the sender
+# adds m repair packets; repair j is the XOR of the group's packets whose
+# position i in the group has i % m == j, zero padded to the longest. Any loss
+# pattern with at most one missing packet per residue class is recovered, so
+# with m repairs a burst of up to m consecutive losses costs nothing. Only XOR
+# is needed on the flight side, which is cheap enough for the MCU, unlike a
+# Reed-Solomon code.
+#
+# Packets are identified by their 16-bit sequence number, supplied by the
+# caller on both sides (lib.telemetry puts it in the packet header).
+#
+#   repair   <BHBBBB  REPAIR marker, sequence number of the first packet of the
+#                     group, k, m, j, XOR of the covered packet lengths,
+#                     then the XOR of the covered packets
+import struct
+
+REPAIR = 0xF0  # first byte of a repair packet, never a telemetry VERSION
+
+REPAIR_FORMAT = "<BHBBBB"
+REPAIR_SIZE = struct.calcsize(REPAIR_FORMAT)
+
+MAX_PAYLOAD = 251  # RFM9x.tx_payload
+MAX_DATA = MAX_PAYLOAD - REPAIR_SIZE  # longest data packet a repair can cover
+
+
+class FecEncoder:
+    """Accumulates the parity of outgoing data packets in preallocated buffers.
+    Call add() after each data packet; once ready, send the m packets written
+    by repair_into().
+    """
+
+    def __init__(self, k=8, m=1):
+        assert 0 < m <= k <= 255
+        self.k = k
+        self.m = m
+        self.ready = False
+        """True when a group is complete and its repair packets can be sent."""
+        self._parity = [bytearray(MAX_DATA) for _ in range(m)]
+        self._lengths = bytearray(m)  # XOR of the covered lengths
+        self._longest = bytearray(m)  # bytes of _parity in use
+        self._first = 0
+        self._count = 0
+
+    def add(self, packet, length, seq):
+        """Account the first length bytes of the data packet numbered seq."""
+        assert length <= MAX_DATA
+        if self._count == 0:
+            self._first = seq
+            for j in range(self.m):
+                parity = self._parity[j]
+                for i in range(self._longest[j]):
+                    parity[i] = 0
+                self._lengths[j] = 0
+                self._longest[j] = 0
+            self.ready = False
+        j = self._count % self.m
+        parity = self._parity[j]
+        for i in range(length):
+            parity[i] ^= packet[i]
+        self._lengths[j] ^= length
+        if length > self._longest[j]:
+            self._longest[j] = length
+        self._count += 1
+        if self._count == self.k:
+            self._count = 0
+            self.ready = True
+
+    def repair_into(self, j, buf):
+        """Write repair packet j of the completed group into buf.
+
+           Returns: the packet length in bytes.
+        """
+        struct.pack_into(
+            REPAIR_FORMAT, buf, 0,
+            REPAIR, self._first, self.k, self.m, j, self._lengths[j],
+        )
+        longest = self._longest[j]
+        parity = self._parity[j]
+        for i in range(longest):
+            buf[REPAIR_SIZE + i] = parity[i]
+        if j == self.m - 1:
+            self.ready = False
+        return REPAIR_SIZE + longest
+
+
+def is_repair(packet):
+    """True if packet is a repair packet rather than a data packet."""
+    return len(packet) >= REPAIR_SIZE and packet[0] == REPAIR
+
+
+class FecDecoder:
+    """Rebuilds lost data packets on the ground from the repair packets. Keeps
+    the data packets of the last window sequence numbers.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.recovered = 0
+        """Data packets rebuilt so far."""
+        self.unrecoverable = 0
+        """Repair packets that arrived with more than one covered packet missing."""
+        self._packets = {}
+        self._newest = None
+
+    def add(self, packet, seq):
+        """Remember a received data packet numbered seq."""
+        self._packets[seq] = bytes(packet)
+        if self._newest is None or (seq - self._newest) & 0xFFFF < 0x8000:
+            self._newest = seq
+        if len(self._packets) > self.window:
+            # forget everything older than the window, in sequence order
+            for old in list(self._packets):
+                if (self._newest - old) & 0xFFFF >= self.window:
+                    del self._packets[old]
+
+    def repair(self, packet):
+        """Process a repair packet.
+
+           Returns: (seq, packet) of the data packet it rebuilt, or None if
+           nothing was missing or too much was.
+        """
+        marker, first, k, m, j, length = struct.unpack_from(REPAIR_FORMAT, packet, 0)
+        missing = None
+        data = bytearray(packet[REPAIR_SIZE:])
+        for i in range(j, k, m):
+            seq = (first + i) & 0xFFFF
+            source = self._packets.get(seq)
+            if source is None:
+                if missing is not None:
+                    self.unrecoverable += 1
+                    return None
+                missing = seq
+                continue
+            length ^= len(source)
+            for n in range(len(source)):
+                data[n] ^= source[n]
+        if missing is None or length > len(data):
+            return None
+        self.recovered += 1
+        rebuilt = bytes(data[:length])
+        self.add(rebuilt, missing)
+        return missing, rebuilt
@@ -1,109 +1,499 @@
 from machine import UART, Pin
+from micropython import const
+import asyncio
 import time
 
+_MAX_SENTENCE = const(96)  # NMEA 0183 limits a sentence to 82 characters
+_MAX_FIELDS = const(32)
+_RX_CHUNK = const(128)
+_UART_RXBUF = const(1024)
+_BAUD_SETTLE_MS = const(100)  # for the module to switch rate after PMTK251
+
+# Bit mask of sentence types returned by NMEAParser.feed()
+GGA = const(0x01)
+RMC = const(0x02)
+TXT = const(0x04)
+ACK = const(0x08)
+
+# PMTK_ACK result flags
+ACK_INVALID = const(0)
+ACK_UNSUPPORTED = const(1)
+ACK_FAILED = const(2)
+ACK_OK = const(3)
+
+ANTENNA_STATUS = ('UNKNOWN', 'OK', 'OPEN', 'SHORT')
+
+
+class GpsFix:
+    # Compact position record, updated in place by NMEAParser so the GPS path
+    # allocates nothing per sentence. Integers keep the full NMEA precision
+    # (float32 only resolves ~1e-5 degrees) and can be packed into telemetry
+    # as they are.
+    __slots__ = ('time', 'latitude', 'longitude', 'altitude', 'quality',
+                 'satellites', 'rmc_valid', 'speed', 'date', 'ticks')
+
+    def __init__(self):
+        self.time = 0  # UTC milliseconds of day
+        self.latitude = 0  # int32, 1e-7 degrees, south negative
+        self.longitude = 0  # int32, 1e-7 degrees, west negative
+        self.altitude = 0  # millimetres above mean sea level (GGA)
+        self.quality = 0  # GGA fix quality, 0 means no fix
+        self.satellites = 0  # GGA
+        self.rmc_valid = False  # RMC status A
+        self.speed = 0  # 1e-3 knots (RMC)
+        self.date = 0  # ddmmyy (RMC)
+        self.ticks = 0  # time.ticks_ms() when this fix was decoded
+
+
+class NMEAParser:
+    # Incremental NMEA 0183 parser working on raw bytes. Input can be fed in
+    # chunks of any size: sentences split across reads are reassembled in a
+    # fixed line buffer, only sentences with a valid *hh checksum are decoded and
+    # fields are parsed in place into integers, so no str or list is created.
+    def __init__(self):
+        self._line = bytearray(_MAX_SENTENCE)  # sentence without the leading '$'
+        self._len = 0
+        self._active = False
+        self._sum = 0
+        self._star = -1
+        self._fields = bytearray(_MAX_FIELDS + 1)  # start offset of each field
+        self._nfields = 0
+        self._err = False
+        self._position = False
+        self._epoch = -1
+        self.fixes = 0  # distinct fix epochs (by UTC time) decoded from GGA or RMC
+        self.dropped = 0  # sentences with a bad checksum, bad fields or no terminator
+        self.overflows = 0  # sentences longer than the line buffer
+        self.fix = GpsFix()  # Newest position, shared by GGA and RMC
+        # TXT antenna status, index into ANTENNA_STATUS
+        self.antenna = 0
+        # Last PMTK_ACK ($PMTK001,cmd,flag)
+        self.ack_cmd = -1
+        self.ack_flag = ACK_INVALID
+
+    # Feed n bytes of buf, returns a mask of the sentence types decoded.
+    def feed(self, buf, n):
+        updated = 0
+        line = self._line
+        length = self._len
+        active = self._active
+        csum = self._sum
+        star = self._star
+        for i in range(n):
+            b = buf[i]
+            if b == 0x24:  # '$' always starts a new sentence
+                if active:
+                    self.dropped += 1
+                active = True
+                length = 0
+                csum = 0
+                star = -1
+            elif not active:
+                continue
+            elif b == 0x0d or b == 0x0a:
+                active = False
+                self._len = length
+                self._sum = csum
+                self._star = star
+                updated |= self._complete()
+            elif length == _MAX_SENTENCE:
+                active = False
+                self.overflows += 1
+            else:
+                if star < 0:
+                    if b == 0x2a:  # '*'
+                        star = length
+                    else:
+                        csum ^= b
+                line[length] = b
+                length += 1
+        self._len = length
+        self._active = active
+        self._sum = csum
+        self._star = star
+        return updated
+
+    @staticmethod
+    def _hex(b):
+        if 0x30 <= b <= 0x39:
+            return b - 0x30
+        if 0x41 <= b <= 0x46:
+            return b - 0x37
+        if 0x61 <= b <= 0x66:
+            return b - 0x57
+        return -1
+
+    def _complete(self):
+        line = self._line
+        star = self._star
+        if star < 0 or self._len != star + 3:
+            self.dropped += 1
+            return 0
+        hi = self._hex(line[star + 1])
+        lo = self._hex(line[star + 2])
+        if hi < 0 or lo < 0 or (hi << 4 | lo) != self._sum:
+            self.dropped += 1
+            return 0
+        fields = self._fields
+        fields[0] = 0
+        nf = 1
+        for i in range(star):
+            if line[i] == 0x2c and nf < _MAX_FIELDS:  # ','
+                fields[nf] = i + 1
+                nf += 1
+        fields[nf] = star + 1  # sentinel, field i ends at fields[i + 1] - 1
+        self._nfields = nf
+        self._err = False
+        self._position = False
+        if fields[1] != 6:  # Talker (2) + sentence type (3) + ','
+            return self._parse_pmtk()
+        t0 = line[2]
+        t1 = line[3]
+        t2 = line[4]
+        if t0 == 0x47 and t1 == 0x47 and t2 == 0x41:  # GGA, any talker (GP, GN, ...)
+            updated = self._parse_gga()
+        elif t0 == 0x52 and t1 == 0x4d and t2 == 0x43:  # RMC
+            updated = self._parse_rmc()
+        elif t0 == 0x54 and t1 == 0x58 and t2 == 0x54:  # TXT
+            updated = self._parse_txt()
+        else:
+            return 0
+        if self._err:
+            # the parsers leave the fix untouched until a sentence parsed cleanly
+            self._position = False
+            self.dropped += 1
+            return 0
+        if self._position:
+            self._position = False
+            if self.fix.time != self._epoch:
+                self._epoch = self.fix.time
+                self.fixes += 1
+        return updated
+
+    def _empty(self, f):
+        return f >= self._nfields or self._fields[f + 1] - 1 == self._fields[f]
+
+    # Decimal number between offsets i and end as an integer scaled by
+    # 10**places. Extra fraction digits are truncated.
+    def _number(self, i, end, places):
+        line = self._line
+        neg = False
+        if i < end and line[i] == 0x2d:  # '-'
+            neg = True
+            i += 1
+        v = 0
+        frac = -1
+        while i < end:
+            b = line[i]
+            if b == 0x2e:  # '.'
+                frac = 0
+            elif 0x30 <= b <= 0x39:
+                if frac < 0:
+                    v = v * 10 + b - 0x30
+                elif frac < places:
+                    v = v * 10 + b - 0x30
+                    frac += 1
+            else:
+                self._err = True
+                return 0
+            i += 1
+        if frac < 0:
+            frac = 0
+        while frac < places:
+            v *= 10
+            frac += 1
+        return -v if neg else v
+
+    def _fixed(self, f, places):
+        if f >= self._nfields:
+            self._err = True
+            return 0
+        return self._number(self._fields[f], self._fields[f + 1] - 1, places)
+
+    # hhmmss.sss into milliseconds of day
+    def _time(self, f):
+        t = self._fixed(f, 3)
+        return (t // 10000000) * 3600000 + (t // 100000 % 100) * 60000 + t % 100000
+
+    # (d)ddmm.mmmm in field f, hemisphere in field f + 1, into 1e-7 degrees
+    def _coordinate(self, f):
+        if self._empty(f) or self._empty(f + 1):
+            self._err = True
+            return 0
+        line = self._line
+        i = self._fields[f]
+        end = self._fields[f + 1] - 1
+        dot = i
+        while dot < end and line[dot] != 0x2e:
+            dot += 1
+        deg = self._number(i, dot - 2, 0)
+        minutes = self._number(dot - 2, end, 5)  # 1e-5 minutes
+        v = deg * 10000000 + minutes * 5 // 3  # minutes * 1e2 / 60
+        h = line[self._fields[f + 1]]
+        return -v if h == 0x53 or h == 0x57 else v  # 'S', 'W'
+
+    # time, lat, N/S, lon, E/W, quality, satellites, hdop, altitude, M, ...
+    # Every field is parsed before the fix is touched, so a sentence with a bad
+    # field leaves the previous fix intact.
+    def _parse_gga(self):
+        if self._nfields < 10:
+            self._err = True
+            return 0
+        quality = self._fixed(6, 0)
+        satellites = self._fixed(7, 0)
+        if quality:
+            t = self._time(1)
+            latitude = self._coordinate(2)
+            longitude = self._coordinate(4)
+            altitude = self._fixed(9, 3)
+        if self._err:
+            return 0
+        fix = self.fix
+        fix.quality = quality
+        fix.satellites = satellites
+        if quality:
+            self._position = True
+            fix.time = t
+            fix.latitude = latitude
+            fix.longitude = longitude
+            fix.altitude = altitude
+        return GGA
+
+    # time, status, lat, N/S, lon, E/W, speed, course, date, ...
+    def _parse_rmc(self):
+        if self._nfields < 10:
+            self._err = True
+            return 0
+        valid = self._line[self._fields[2]] == 0x41  # 'A'
+        if valid:
+            t = self._time(1)
+            latitude = self._coordinate(3)
+            longitude = self._coordinate(5)
+            speed = self._fixed(7, 3)
+            date = self._fixed(9, 0)
+        if self._err:
+            return 0
+        fix = self.fix
+        fix.rmc_valid = valid
+        if valid:
+            self._position = True
+            fix.time = t
+            fix.latitude = latitude
+            fix.longitude = longitude
+            fix.speed = speed
+            fix.date = date
+        return RMC
+
+    # PMTK001,cmd,flag acknowledges a PMTK command
+    def _parse_pmtk(self):
+        key = b'PMTK001'
+        if self._fields[1] != len(key) + 1 or self._nfields < 3:
+            return 0
+        for j in range(len(key)):
+            if self._line[j] != key[j]:
+                return 0
+        cmd = self._fixed(1, 0)
+        flag = self._fixed(2, 0)
+        if self._err:
+            self.dropped += 1
+            return 0
+        self.ack_cmd = cmd
+        self.ack_flag = flag
+        return ACK
+
+    # Antenna status is reported as the last field, e.g. ANTSTATUS=OK
+    def _parse_txt(self):
+        line = self._line
+        i = self._fields[self._nfields - 1]
+        key = b'ANTSTATUS='
+        if self._fields[self._nfields] - 1 - i <= len(key):
+            return 0
+        for j in range(len(key)):
+            if line[i + j] != key[j]:
+                return 0
+        i += len(key)
+        if line[i] == 0x53:  # SHORT
+            self.antenna = 3
+        elif line[i] == 0x4f and line[i + 1] == 0x50:  # OPEN
+            self.antenna = 2
+        elif line[i] == 0x4f:  # OK
+            self.antenna = 1
+        else:
+            self.antenna = 0
+        return TXT
+
 
 class L86GPS:
     def __init__(self, uart_id=0, tx_pin=0, rx_pin=1):
         # Default baudrate is 9600 according to datasheet
-        self.uart = UART(uart_id, baudrate=9600, tx=Pin(tx_pin), rx=Pin(rx_pin))
+        self.uart = UART(uart_id, baudrate=9600, tx=Pin(tx_pin), rx=Pin(rx_pin), rxbuf=_UART_RXBUF)
+        self.baudrate = 9600
+        self.parser = NMEAParser()
+        self.fix = self.parser.fix  # Updated in place, see take_fix()
+        self._rx = bytearray(_RX_CHUNK)
+        self._fixes = 0
+        self._last_update = time.ticks_ms()
+        self.fix_pending = False  # a fix newer than the last take_fix() is available
+        self.stale = 0  # fixes superseded by a newer one before they were taken
+        self.rx_overflows = 0  # drains that found the UART buffer full, so bytes were lost
+        self.byte_rate = 0.0  # smoothed input rate in bytes per ms
         self.init_module()
 
     def init_module(self):
         # Enable default configurations as per datasheet
-        self._send_command("$PMTK286,1*23")  # Enable AIC
-        self._send_command("$PMTK314,1,1,1,1,1,1,0,0,0,0,0,0,0,0,0,0,0,1,0*28")  # Enable default NMEA sentences
-        self._send_command("$PMTK220,1000*1F")  # Set update rate to 1Hz
-
-    def _send_command(self, command):
-        self.uart.write((command + '\r\n').encode())
-        time.sleep(0.1)
-
-    def read_gps(self):
-        if self.uart.any():
-            try:
-                sentence = self.uart.readline().decode('utf-8').strip()
-                if sentence.startswith('$GPGGA'):
-                    return self._parse_gpgga(sentence)
-                elif sentence.startswith('$GPRMC'):
-                    return self._parse_gprmc(sentence)
-                elif sentence.startswith('$GPTXT'):
-                    return self._parse_gptxt(sentence)
-            except Exception:
-                return None
-        return None
-
-    def _parse_gpgga(self, sentence):
-        try:
-            parts = sentence.split(',')
-            if parts[6] == '0':  # Fix quality indicator
-                return {'type': 'GPGGA', 'status': 'no_fix'}
-
-            return {
-                'type': 'GPGGA',
-                'status': 'valid',
-                'time': parts[1],
-                'latitude': self._convert_to_degrees(parts[2], parts[3]),
-                'longitude': self._convert_to_degrees(parts[4], parts[5]),
-                'quality': int(parts[6]),
-                'satellites': int(parts[7]),
-                'altitude': float(parts[9]),
-                'altitude_unit': parts[10]
-            }
-        except Exception as e:
-            return {'type': 'GPGGA', 'status': 'error', 'error': str(e)}
-
-    def _parse_gprmc(self, sentence):
-        try:
-            parts = sentence.split(',')
-            if parts[2] != 'A':  # A = valid, V = invalid
-                return {'type': 'GPRMC', 'status': 'invalid'}
-
-            return {
-                'type': 'GPRMC',
-                'status': 'valid',
-                'time': parts[1],
-                'latitude': self._convert_to_degrees(parts[3], parts[4]),
-                'longitude': self._convert_to_degrees(parts[5], parts[6]),
-                'speed': float(parts[7]),
-                'date': parts[9]
-            }
-        except Exception as e:
-            return {'type': 'GPRMC', 'status': 'error', 'error': str(e)}
-
-    def _parse_gptxt(self, sentence):
-        # Parse antenna status messages
-        # TODO (Noah): I don't like this
-        try:
-            parts = sentence.split(',')
-            if 'ANTSTATUS' in sentence:
-                return {
-                    'type': 'GPTXT',
-                    'antenna_status': parts[-1].split('*')[0]
-                }
-        except Exception:
-            return None
-
-    def _convert_to_degrees(self, value, direction):
-        if not value:
-            return None
-
-        try:
-            # Handle NMEA format (ddmm.mmmm)
-            decimal_degrees = float(value[:2]) + float(value[2:]) / 60.0
-            if direction in ['S', 'W']:
-                decimal_degrees = -decimal_degrees
-            return round(decimal_degrees, 6)
-        except Exception:
-            return None
+        self.send_pmtk("PMTK286,1")  # Enable AIC
+        self.send_pmtk("PMTK314,1,1,1,1,1,1,0,0,0,0,0,0,0,0,0,0,0,1,0")  # Enable default NMEA sentences
+        self.send_pmtk("PMTK220,1000")  # Set update rate to 1Hz
+
+    # Switch to a fast link and fix rate: raise the module and UART baud rate
+    # (PMTK251), output only GGA and RMC, and set the fix interval (PMTK220).
+    # PMTK251 is not acknowledged, so the PMTK314 ACK verifies the new rate;
+    # without it the switch is tried once more from the old rate, then the
+    # module is put back to the old rate and the defaults of init_module().
+    # Returns True when every acknowledged step reported success.
+    def configure_high_rate(self, rate_hz=10, baudrate=115200):
+        if not 1 <= rate_hz <= 10:
+            raise ValueError('fix rate must be between 1 and 10 Hz')
+        if baudrate not in (4800, 9600, 14400, 19200, 38400, 57600, 115200):
+            raise ValueError('unsupported baud rate {}'.format(baudrate))
+        old = self.baudrate
+        for _ in range(2):
+            self._set_baudrate(baudrate)
+            if self.send_pmtk("PMTK314,0,1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0"):  # GGA + RMC
+                return self.send_pmtk("PMTK220,{}".format(1000 // rate_hz))
+            # the module may still be at the old rate, or missed only the ACK
+            self._reinit_uart(old)
+        # in case it did switch, ask it back from the new rate before giving up
+        self._reinit_uart(baudrate)
+        self._set_baudrate(old)
+        self.init_module()
+        return False
+
+    # Send PMTK251 at the current rate, then follow with the UART.
+    def _set_baudrate(self, baudrate):
+        self.send_pmtk("PMTK251,{}".format(baudrate), ack=False)
+        self._reinit_uart(baudrate)
+
+    def _reinit_uart(self, baudrate):
+        self.uart.flush()  # let the last command out at the old rate
+        self.uart.init(baudrate=baudrate)
+        self.baudrate = baudrate
+        time.sleep_ms(_BAUD_SETTLE_MS)
+
+    @staticmethod
+    def checksum(body):
+        csum = 0
+        for c in body:
+            csum ^= ord(c)
+        return csum
+
+    # Send a PMTK command given without '$' and checksum. If ack is set, wait
+    # for the matching PMTK_ACK and return True when it reports success.
+    def send_pmtk(self, body, ack=True, timeout_ms=1000):
+        self.uart.write('${}*{:02X}\r\n'.format(body, self.checksum(body)).encode())
+        if not ack:
+            return True
+        return self._wait_ack(int(body[4:7]), timeout_ms)  # PMTK + 3 digit command number
+
+    def _wait_ack(self, cmd, timeout_ms):
+        p = self.parser
+        p.ack_cmd = -1
+        start = time.ticks_ms()
+        while time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
+            if self.update() & ACK and p.ack_cmd == cmd:
+                return p.ack_flag == ACK_OK
+            time.sleep_ms(10)
+        return False
+
+    # Run every byte waiting on the UART through the parser, so each call
+    # consumes the whole backlog. Returns the mask of sentence types decoded.
+    def update(self):
+        now = time.ticks_ms()
+        waiting = self._check_overflow()
+        updated = 0
+        total = 0
+        while waiting:
+            n = self.uart.readinto(self._rx)
+            if not n:
+                break
+            total += n
+            updated |= self._feed(n, now)
+            waiting = self.uart.any()
+        elapsed = time.ticks_diff(now, self._last_update)
+        if elapsed > 0:
+            self.byte_rate = (self.byte_rate * 3 + total / elapsed) / 4
+            self._last_update = now
+        return updated
+
+    # Async iterator over new fixes that only wakes when UART bytes arrive:
+    #     async for fix in gps.fixes():
+    # The yielded GpsFix is self.fix, updated in place.
+    def fixes(self):
+        return _FixStream(self)
+
+    def _check_overflow(self):
+        waiting = self.uart.any()
+        if waiting >= _UART_RXBUF - 1:
+            self.rx_overflows += 1
+        return waiting
+
+    # Parse n bytes of the receive chunk and account for any new fix.
+    def _feed(self, n, now):
+        updated = self.parser.feed(self._rx, n)
+        fixes = self.parser.fixes - self._fixes
+        if fixes:
+            self._fixes = self.parser.fixes
+            self.stale += fixes - 1 + self.fix_pending
+            self.fix_pending = True
+            self.fix.ticks = now
+        return updated
+
+    # True once per new fix; the position is then read from self.fix.
+    def take_fix(self):
+        if not self.fix_pending:
+            return False
+        self.fix_pending = False
+        return True
+
+    def fix_age_ms(self):
+        return time.ticks_diff(time.ticks_ms(), self.fix.ticks)
+
+    # Delay until the UART buffer is about a quarter full at the observed input
+    # rate, so polling follows the sentence rate instead of a fixed period.
+    def poll_interval_ms(self, lo=10, hi=200):
+        if self.byte_rate <= 0:
+            return hi
+        return max(lo, min(hi, int(_UART_RXBUF // 4 / self.byte_rate)))
 
     def enable_easy(self):
-        self._send_command("$PMTK869,1,1*34")
+        return self.send_pmtk("PMTK869,1,1")
 
     def disable_easy(self):
-        self._send_command("$PMTK869,1,0*34")
+        return self.send_pmtk("PMTK869,1,0")
 
     def enter_standby(self):
-        self._send_command("$PMTK161,0*28")
+        self.send_pmtk("PMTK161,0", ack=False)
 
     def enter_backup(self):
-        self._send_command("$PMTK225,4*2F")
\ No newline at end of file
+        self.send_pmtk("PMTK225,4", ack=False)
+
+
+class _FixStream:
+    # Returned by L86GPS.fixes(). The asyncio StreamReader parks the task on
+    # the UART until bytes are readable, so there are no idle wakeups and a fix
+    # is delivered as soon as its sentence is complete.
+    def __init__(self, gps):
+        self._gps = gps
+        self._reader = asyncio.StreamReader(gps.uart)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        gps = self._gps
+        while not gps.take_fix():
+            gps._check_overflow()
+            n = await self._reader.readinto(gps._rx)
+            if n:
+                gps._feed(n, time.ticks_ms())
+        return gps.fix
@@ -36,6 +36,8 @@ http: www.airspayce.com/mikem/arduino/RadioHead/
 
 import time
 import random
+import asyncio
+from array import array
 from micropython import const
 
 __version__ = "0.0.0-auto.0"
@@ -99,6 +101,49 @@ _RH_RF95_DETECTION_THRESHOLD = const(0x37)
 _RH_RF95_PA_DAC_DISABLE = const(0x04)
 _RH_RF95_PA_DAC_ENABLE = const(0x07)
 
+# Configuration registers that only change when written by the host, so they
+# can be answered from the shadow copy instead of read over SPI. OP_MODE is
+# included: the only autonomous transition used (TX -> STANDBY after TxDone)
+# is applied to the shadow explicitly.
+_SHADOWED_REGISTERS = (
+    _RH_RF95_REG_01_OP_MODE,
+    _RH_RF95_REG_06_FRF_MSB,
+    _RH_RF95_REG_07_FRF_MID,
+    _RH_RF95_REG_08_FRF_LSB,
+    _RH_RF95_REG_09_PA_CONFIG,
+    _RH_RF95_REG_0A_PA_RAMP,
+    _RH_RF95_REG_0B_OCP,
+    _RH_RF95_REG_0C_LNA,
+    _RH_RF95_REG_0E_FIFO_TX_BASE_ADDR,
+    _RH_RF95_REG_0F_FIFO_RX_BASE_ADDR,
+    _RH_RF95_REG_1D_MODEM_CONFIG1,
+    _RH_RF95_REG_1E_MODEM_CONFIG2,
+    _RH_RF95_REG_20_PREAMBLE_MSB,
+    _RH_RF95_REG_21_PREAMBLE_LSB,
+    _RH_RF95_REG_22_PAYLOAD_LENGTH,
+    _RH_RF95_REG_23_MAX_PAYLOAD_LENGTH,
+    _RH_RF95_REG_26_MODEM_CONFIG3,
+    _RH_RF95_DETECTION_OPTIMIZE,
+    _RH_RF95_DETECTION_THRESHOLD,
+    _RH_RF95_REG_40_DIO_MAPPING1,
+    _RH_RF95_REG_41_DIO_MAPPING2,
+    _RH_RF95_REG_4D_PA_DAC,
+)
+_SHADOWED = bytearray(128)
+for _address in _SHADOWED_REGISTERS:
+    _SHADOWED[_address] = 1
+
+# Registers time_on_air() depends on: a change bumps RFM9x.modem_epoch.
+_AIRTIME = bytearray(128)
+for _address in (
+    _RH_RF95_REG_1D_MODEM_CONFIG1,
+    _RH_RF95_REG_1E_MODEM_CONFIG2,
+    _RH_RF95_REG_20_PREAMBLE_MSB,
+    _RH_RF95_REG_21_PREAMBLE_LSB,
+    _RH_RF95_REG_26_MODEM_CONFIG3,
+):
+    _AIRTIME[_address] = 1
+
 # The crystal oscillator frequency of the module
 _RH_RF95_FXOSC = 32000000.0
 
@@ -230,6 +275,19 @@ class RFM9x:
 
     bw_bins = (7800, 10400, 15600, 20800, 31250, 41700, 62500, 125000, 250000)
 
+    # Modem profiles for apply_profile():
+    # name: (signal_bandwidth, coding_rate, spreading_factor, enable_crc, tx_power)
+    PROFILES = {
+        # RadioHead Bw125Cr45Sf128 defaults, set on init.
+        "radiohead": (125000, 5, 7, False, 13),
+        # Highest bit rate, ~22 kbps raw, for boost and coast telemetry.
+        "max-throughput": (500000, 5, 7, True, 14),
+        # ~610 bps raw; against max-throughput ~18 dB better sensitivity
+        # (SF10, a quarter of the bandwidth) plus 6 dB more TX power, for
+        # descent and recovery.
+        "long-range": (125000, 8, 10, True, 20),
+    }
+
     def __init__(
         self,
         spi,
@@ -246,6 +304,10 @@ class RFM9x:
         # initialize Reset High
         self.spi = spi
         self.cs = cs
+        self.modem_epoch = 0
+        """Incremented whenever a register time_on_air() depends on changes,
+           so callers can cache airtimes until it does.
+        """
         self.reset()
         # No device type check!  Catch an error from the very first request and
         # throw a nicer message to indicate possible wiring problems.
@@ -260,6 +322,8 @@ class RFM9x:
         self.sleep()
         time.sleep(0.01)
         self.long_range_mode = True
+        # Check the mode on the chip itself, not the shadow of what was written.
+        self.resync()
         if self.operation_mode != SLEEP_MODE or not self.long_range_mode:
             raise RuntimeError("Failed to configure radio for LoRa mode, check wiring!")
         # clear default setting for access to LF registers if frequency > 525MHz
@@ -274,16 +338,13 @@ class RFM9x:
         self.frequency_mhz = frequency
         # Set preamble length (default 8 bytes to match radiohead).
         self.preamble_length = preamble_length
-        # Defaults set modem config to RadioHead compatible Bw125Cr45Sf128 mode.
-        self.signal_bandwidth = 125000
-        self.coding_rate = 5
-        self.spreading_factor = 7
-        # Default to disable CRC checking on incoming packets.
-        self.enable_crc = False
-        # Note no sync word is set for LoRa mode either!
-        self._write_u8(_RH_RF95_REG_26_MODEM_CONFIG3, 0x00)  # Preamble lsb?
-        # Set transmit power to 13 dBm, a safe value any module supports.
-        self.tx_power = 13
+        # Defaults set modem config to RadioHead compatible Bw125Cr45Sf128 mode,
+        # CRC checking disabled and 13 dBm transmit power, a safe value any
+        # module supports. Note no sync word is set for LoRa mode either!
+        self._modem_config = bytearray(2)
+        self.profile = None
+        """Name of the last profile applied with apply_profile()."""
+        self.apply_profile("radiohead")
         # initialize last RSSI reading
         self.last_rssi = 0.0
         """The RSSI of the last received packet. Stored when the packet was received.
@@ -336,6 +397,32 @@ class RFM9x:
            Fourth byte of the RadioHead header.
         """
         self.crc_error_count = 0
+        self.dio0 = None
+        """Pin wired to DIO0, set by attach_dio0(). When None the async methods
+           fall back to polling the IRQ flags register.
+        """
+        self.poll_interval = 2
+        """Milliseconds between IRQ flag polls in the async methods without DIO0."""
+        self._dio0_flag = asyncio.ThreadSafeFlag()
+        self._dio0_ticks = 0  # time.ticks_ms() of the last DIO0 edge
+        self.last_snr = 0.0
+        """The SNR (in dB) of the last packet returned by receive_into()."""
+        self.last_rx_ticks = 0
+        """time.ticks_ms() at which the last packet returned by receive_into() arrived."""
+        self.rx_overruns = 0
+        """Packets dropped because the continuous receive ring was full."""
+        self._rx_ring = None
+        # TX frame as clocked out over SPI: FIFO write address, RadioHead
+        # header, then the payload.
+        self._tx_frame = bytearray(256)
+        self._tx_frame[0] = _RH_RF95_REG_00_FIFO | 0x80
+        self._tx_view = memoryview(self._tx_frame)
+        self._tx_burst = self._tx_view[:0]
+        self.tx_payload = self._tx_view[5:]
+        """Writable memoryview of the 251 payload bytes of the TX frame buffer.
+           Encode a packet here and send it with send_payload() to avoid
+           copying it.
+        """
 
     # pylint: disable=no-member
     # Reconsider pylint: disable when this can be tested
@@ -349,6 +436,18 @@ class RFM9x:
 
     def _read_u8(self, address):
         # Read a single byte from the provided address and return it.
+        # Shadowed configuration registers are answered without SPI traffic
+        # once their value is known.
+        address &= 0x7F
+        if self._shadow_valid[address]:
+            return self._shadow[address]
+        value = self._read_u8_uncached(address)
+        if _SHADOWED[address]:
+            self._shadow[address] = value
+            self._shadow_valid[address] = 1
+        return value
+
+    def _read_u8_uncached(self, address):
         self.cs.value(0)
         self.spi.write(bytes([address & 0x7F]))
         value = self.spi.read(1)
@@ -365,12 +464,196 @@ class RFM9x:
 
     def _write_u8(self, address, val):
         # Write a byte register to the chip.  Specify the 7-bit address and the
-        # 8-bit value to write to that address.
-        address = (address | 0x80) & 0xFF  # Set top bit to 1 to
+        # 8-bit value to write to that address.  Writes that would not change a
+        # shadowed register are skipped.
+        address &= 0x7F
         val = val & 0xFF
+        if self._shadow_valid[address] and self._shadow[address] == val:
+            return
         self.cs.value(0)
-        self.spi.write(bytes([address,val]))
+        self.spi.write(bytes([address | 0x80, val]))  # Set top bit to 1 to write
         self.cs.value(1)
+        if _AIRTIME[address]:
+            self.modem_epoch += 1
+        if _SHADOWED[address]:
+            self._shadow[address] = val
+            self._shadow_valid[address] = 1
+
+    def resync(self):
+        """Reload the shadow copy of the configuration registers from the chip,
+        e.g. after a reset or if the chip may have been changed behind the
+        driver's back.
+        """
+        for address in _SHADOWED_REGISTERS:
+            self._shadow[address] = self._read_u8_uncached(address)
+            self._shadow_valid[address] = 1
+        self.modem_epoch += 1
+
+    def verify(self):
+        """Compare the shadow copy with the chip.
+
+           Returns: a list of the register addresses that differ, empty if in sync.
+        """
+        return [
+            address
+            for address in _SHADOWED_REGISTERS
+            if self._shadow_valid[address]
+            and self._read_u8_uncached(address) != self._shadow[address]
+        ]
+
+    def attach_dio0(self, pin):
+        """Use the DIO0 interrupt (TxDone/RxDone) to wake the async methods
+        instead of polling. pin is a machine.Pin connected to the radio's DIO0.
+        """
+        self.dio0 = pin
+        pin.irq(trigger=pin.IRQ_RISING, handler=self._dio0_handler)
+
+    def _dio0_handler(self, pin):
+        # Only wake the waiting task. Touching the SPI bus here could split a
+        # transaction the main task has in progress (chip select is driven
+        # around several calls), so the FIFO is read in task context.
+        # ticks_ms() and ThreadSafeFlag.set() are safe from hard and soft
+        # interrupt context.
+        self._dio0_ticks = time.ticks_ms()
+        self._dio0_flag.set()
+
+    def start_continuous_receive(self, depth=8):
+        """Stay in RXCONTINUOUS mode and queue every received packet, with
+        its RSSI, SNR and arrival tick, in a preallocated ring of depth
+        packets. receive_async() moves packets from the FIFO into the ring,
+        woken by the DIO0 RxDone interrupt when attach_dio0() was used,
+        otherwise by polling; keep a task waiting in it so the FIFO is read
+        before the next packet overwrites it. Consume packets with
+        receive_into()/receive_async() and do not use the other receive
+        methods while this mode is active.
+        """
+        self._rx_depth = depth
+        self._rx_ring = bytearray(256 * depth)
+        ring = memoryview(self._rx_ring)
+        self._rx_slots = [ring[i * 256:(i + 1) * 256] for i in range(depth)]
+        self._rx_len = bytearray(depth)
+        self._rx_rssi = array("h", bytearray(2 * depth))
+        self._rx_snr = array("b", bytearray(depth))
+        self._rx_ticks = array("i", bytearray(4 * depth))
+        self._rx_head = 0
+        self._rx_tail = 0
+        self.rx_overruns = 0
+        self._write_u8(_RH_RF95_REG_12_IRQ_FLAGS, 0xFF)
+        self.listen()
+
+    def stop_continuous_receive(self):
+        """Leave continuous receive mode and return to idle."""
+        self._rx_ring = None
+        self.idle()
+
+    def _rx_packet(self):
+        # Move one received packet from the FIFO into the ring. Task context
+        # only, like every other SPI access.
+        flags = self._read_u8(_RH_RF95_REG_12_IRQ_FLAGS)
+        if not flags & 0x40:  # RxDone
+            return
+        # in continuous receive the RxDone edge is the only DIO0 event
+        ticks = time.ticks_ms() if self.dio0 is None else self._dio0_ticks
+        self._write_u8(_RH_RF95_REG_12_IRQ_FLAGS, 0xFF)
+        if flags & 0x20:  # PayloadCrcError
+            self.crc_error_count += 1
+            return
+        head = self._rx_head
+        nxt = head + 1
+        if nxt == self._rx_depth:
+            nxt = 0
+        if nxt == self._rx_tail:
+            self.rx_overruns += 1
+            return
+        length = self._read_u8(_RH_RF95_REG_13_RX_NB_BYTES)
+        self._write_u8(
+            _RH_RF95_REG_0D_FIFO_ADDR_PTR,
+            self._read_u8(_RH_RF95_REG_10_FIFO_RX_CURRENT_ADDR),
+        )
+        self._read_into(_RH_RF95_REG_00_FIFO, self._rx_slots[head][:length])
+        self._rx_len[head] = length
+        self._rx_rssi[head] = self._read_u8(_RH_RF95_REG_1A_PKT_RSSI_VALUE) - 137
+        snr = self._read_u8(_RH_RF95_REG_19_PKT_SNR_VALUE)
+        self._rx_snr[head] = snr - 256 if snr > 127 else snr  # quarter dB
+        self._rx_ticks[head] = ticks
+        self._rx_head = nxt
+
+    def receive_into(self, buf, *, with_header=False):
+        """Copy the oldest packet queued by continuous receive mode into buf.
+        Packets shorter than a RadioHead header plus one byte, or addressed to
+        another node, are skipped. RSSI, SNR and arrival tick are stored in
+        last_rssi, last_snr and last_rx_ticks.
+
+        Returns: the number of bytes copied, 0 if no packet is queued.
+        """
+        while self._rx_ring is not None and self._rx_tail != self._rx_head:
+            tail = self._rx_tail
+            slot = self._rx_slots[tail]
+            length = self._rx_len[tail]
+            accept = length >= 5 and (
+                self.node == _RH_BROADCAST_ADDRESS
+                or slot[0] == _RH_BROADCAST_ADDRESS
+                or slot[0] == self.node
+            )
+            if accept:
+                start = 0 if with_header else 4
+                n = min(length - start, len(buf))
+                buf[:n] = slot[start : start + n]
+                self.last_rssi = self._rx_rssi[tail]
+                self.last_snr = self._rx_snr[tail] / 4
+                self.last_rx_ticks = self._rx_ticks[tail]
+            tail += 1
+            if tail == self._rx_depth:
+                tail = 0
+            self._rx_tail = tail
+            if accept:
+                return n
+        return 0
+
+    async def receive_async(self, buf, *, with_header=False, timeout=None):
+        """Wait for the next packet of continuous receive mode and copy it into
+        buf, yielding to other tasks meanwhile. timeout is in ms, None waits
+        forever.
+
+        Returns: the number of bytes copied, 0 if the timeout elapsed.
+        """
+        start = time.ticks_ms()
+        while True:
+            if self._rx_ring is not None:
+                self._rx_packet()
+            n = self.receive_into(buf, with_header=with_header)
+            if n:
+                return n
+            if timeout is None:
+                remaining = self.receive_timeout
+            else:
+                remaining = timeout - time.ticks_diff(time.ticks_ms(), start)
+                if remaining <= 0:
+                    return 0
+            if self.dio0 is None:
+                await asyncio.sleep_ms(min(self.poll_interval, remaining))
+            else:
+                try:
+                    await asyncio.wait_for_ms(self._dio0_flag.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _wait_irq(self, done, timeout):
+        # Wait until done() reports the IRQ flag or timeout ms elapse, yielding
+        # to other tasks meanwhile. Returns True on timeout.
+        start = time.ticks_ms()
+        while not done():
+            remaining = timeout - time.ticks_diff(time.ticks_ms(), start)
+            if remaining <= 0:
+                return True
+            if self.dio0 is None:
+                await asyncio.sleep_ms(min(self.poll_interval, remaining))
+            else:
+                try:
+                    await asyncio.wait_for_ms(self._dio0_flag.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        return False
 
     def reset(self):
         """Perform a reset of the chip."""
@@ -379,6 +662,10 @@ class RFM9x:
         time.sleep_us(100)  # 100 us
         self._reset.value(1)  # set Reset High
         time.sleep_us(5000)  # 5 ms
+        # Registers are back at their defaults, forget the shadow copy.
+        self._shadow = bytearray(128)
+        self._shadow_valid = bytearray(128)
+        self.modem_epoch += 1
 
     def idle(self):
         """Enter idle standby mode."""
@@ -578,6 +865,75 @@ class RFM9x:
                 self._read_u8(_RH_RF95_REG_1E_MODEM_CONFIG2) & 0xFB,
             )
 
+    def apply_profile(self, name):
+        """Switch to one of the modem configurations in RFM9x.PROFILES.
+           MODEM_CONFIG1 and MODEM_CONFIG2 are written in one burst, followed
+           by MODEM_CONFIG3 (low data rate optimisation is enabled when a
+           symbol lasts longer than 16 ms) and the PA configuration. Registers
+           that already hold the wanted value are not written again, so
+           re-applying the current profile costs no SPI traffic.
+        """
+        bandwidth, coding_rate, spreading_factor, crc, power = self.PROFILES[name]
+        for bw_id, cutoff in enumerate(self.bw_bins):
+            if bandwidth <= cutoff:
+                break
+        else:
+            bw_id = 9
+        config = self._modem_config
+        # Keep the implicit header bit, TX continuous mode and symbol timeout.
+        config[0] = (
+            (self._read_u8(_RH_RF95_REG_1D_MODEM_CONFIG1) & 0x01)
+            | (bw_id << 4)
+            | ((coding_rate - 4) << 1)
+        )
+        config[1] = (
+            (self._read_u8(_RH_RF95_REG_1E_MODEM_CONFIG2) & 0x0B)
+            | (spreading_factor << 4)
+            | (0x04 if crc else 0x00)
+        )
+        if (
+            config[0] != self._shadow[_RH_RF95_REG_1D_MODEM_CONFIG1]
+            or config[1] != self._shadow[_RH_RF95_REG_1E_MODEM_CONFIG2]
+        ):
+            self._write_from(_RH_RF95_REG_1D_MODEM_CONFIG1, config)
+            self._shadow[_RH_RF95_REG_1D_MODEM_CONFIG1] = config[0]
+            self._shadow[_RH_RF95_REG_1E_MODEM_CONFIG2] = config[1]
+            self.modem_epoch += 1
+        self._write_u8(
+            _RH_RF95_DETECTION_OPTIMIZE, 0xC5 if spreading_factor == 6 else 0xC3
+        )
+        self._write_u8(
+            _RH_RF95_DETECTION_THRESHOLD, 0x0C if spreading_factor == 6 else 0x0A
+        )
+        ldro = (1 << spreading_factor) * 1000000 // bandwidth > 16000
+        self._write_u8(_RH_RF95_REG_26_MODEM_CONFIG3, 0x08 if ldro else 0x00)
+        self.tx_power = power
+        self.profile = name
+
+    def time_on_air(self, length):
+        """Time on air in microseconds of a packet carrying length bytes of
+           data plus the 4 byte RadioHead header, for the current modem
+           configuration. Follows the Semtech formula (SX1276 datasheet
+           section 4.1.1.7) including preamble, explicit/implicit header,
+           payload CRC and low data rate optimisation. Integer arithmetic only,
+           the configuration comes from the register shadow.
+        """
+        config1 = self._read_u8(_RH_RF95_REG_1D_MODEM_CONFIG1)
+        config2 = self._read_u8(_RH_RF95_REG_1E_MODEM_CONFIG2)
+        sf = config2 >> 4
+        symbol_us = (1 << sf) * 1000000 // self.signal_bandwidth
+        implicit = config1 & 0x01
+        crc = (config2 >> 2) & 0x01
+        ldro = (self._read_u8(_RH_RF95_REG_26_MODEM_CONFIG3) >> 3) & 0x01
+        bits = 8 * (length + 4) - 4 * sf + 28 + 16 * crc - 20 * implicit
+        step = 4 * (sf - 2 * ldro)
+        payload_symbols = 8
+        if bits > 0:
+            payload_symbols += -(-bits // step) * (((config1 >> 1) & 0x07) + 4)
+        # The preamble is followed by 4.25 symbols of sync word.
+        preamble_quarters = 4 * self.preamble_length + 17
+        return (preamble_quarters * symbol_us) // 4 + payload_symbols * symbol_us
+
     def tx_done(self):
         """Transmit status"""
         return (self._read_u8(_RH_RF95_REG_12_IRQ_FLAGS) & 0x8) >> 3
@@ -601,7 +957,7 @@ class RFM9x:
         flags=None
     ):
         """Send a string of data using the transmitter.
-           You can only send 252 bytes at a time
+           You can only send 251 bytes at a time
            (limited by chip's FIFO size and appended headers).
            This appends a 4 byte header to be compatible with the RadioHead library.
            The header defaults to using the initialized attributes:
@@ -613,48 +969,134 @@ class RFM9x:
 
            Returns: True if success or False if the send timed out.
         """
+        self._start_send(data, destination, node, identifier, flags)
+        return self._wait_send(keep_listening)
+
+    def send_payload(
+        self,
+        length,
+        *,
+        keep_listening=False,
+        destination=None,
+        node=None,
+        identifier=None,
+        flags=None
+    ):
+        """Send the first length bytes already written to tx_payload. Same as
+           send() otherwise, but the payload is not copied and nothing is
+           allocated when consecutive packets have the same length.
+
+           Returns: True if success or False if the send timed out.
+        """
+        self._load_frame(length, destination, node, identifier, flags)
+        return self._wait_send(keep_listening)
+
+    def _wait_send(self, keep_listening):
+        # Wait for tx done interrupt with explicit polling (not ideal but
+        # best that can be done right now without interrupts).
+        start = time.ticks_ms()
+        timed_out = False
+        while not timed_out and not self.tx_done():
+            if time.ticks_diff(time.ticks_ms(), start) >= self.xmit_timeout:
+                timed_out = True
+        self._finish_send(keep_listening, timed_out)
+        return not timed_out
+
+    async def send_async(
+        self,
+        data,
+        *,
+        keep_listening=False,
+        destination=None,
+        node=None,
+        identifier=None,
+        flags=None
+    ):
+        """Same as send() but yields to other asyncio tasks while the packet
+           is on air. TX done is signalled by the DIO0 interrupt when a pin was
+           given to attach_dio0(), otherwise the IRQ flags are polled every
+           poll_interval ms.
+
+           Returns: True if success or False if the send timed out.
+        """
+        self._start_send(data, destination, node, identifier, flags)
+        timed_out = await self._wait_irq(self.tx_done, self.xmit_timeout)
+        self._finish_send(keep_listening, timed_out)
+        return not timed_out
+
+    async def send_payload_async(
+        self,
+        length,
+        *,
+        keep_listening=False,
+        destination=None,
+        node=None,
+        identifier=None,
+        flags=None
+    ):
+        """Same as send_payload() but yields to other asyncio tasks while the
+           packet is on air, like send_async().
+
+           Returns: True if success or False if the send timed out.
+        """
+        self._load_frame(length, destination, node, identifier, flags)
+        timed_out = await self._wait_irq(self.tx_done, self.xmit_timeout)
+        self._finish_send(keep_listening, timed_out)
+        return not timed_out
+
+    def _start_send(self, data, destination, node, identifier, flags):
+        # Copy the data into the frame buffer behind the header.
+        length = len(data)
+        self.tx_payload[:length] = data
+        self._load_frame(length, destination, node, identifier, flags)
+
+    def _load_frame(self, length, destination, node, identifier, flags):
         # Disable pylint warning to not use length as a check for zero.
         # This is a puzzling warning as the below code is clearly the most
         # efficient and proper way to ensure a precondition that the provided
         # buffer be within an expected range of bounds. Disable this check.
         # pylint: disable=len-as-condition
-        assert 0 < len(data) <= 252
+        assert 0 < length <= 251
         # pylint: enable=len-as-condition
         self.idle()  # Stop receiving to clear FIFO and keep it clear.
         # Fill the FIFO with a packet to send.
         self._write_u8(_RH_RF95_REG_0D_FIFO_ADDR_PTR, 0x00)  # FIFO starts at 0.
-        # Combine header and data to form payload
-        payload = bytearray(4)
+        # Fill in the header in front of the payload
+        frame = self._tx_frame
         if destination is None:  # use attribute
-            payload[0] = self.destination
+            frame[1] = self.destination
         else:  # use kwarg
-            payload[0] = destination
+            frame[1] = destination
         if node is None:  # use attribute
-            payload[1] = self.node
+            frame[2] = self.node
         else:  # use kwarg
-            payload[1] = node
+            frame[2] = node
         if identifier is None:  # use attribute
-            payload[2] = self.identifier
+            frame[3] = self.identifier
         else:  # use kwarg
-            payload[2] = identifier
+            frame[3] = identifier
         if flags is None:  # use attribute
-            payload[3] = self.flags
+            frame[4] = self.flags
         else:  # use kwarg
-            payload[3] = flags
-        payload = payload + data
-        # Write payload.
-        self._write_from(_RH_RF95_REG_00_FIFO, payload)
+            frame[4] = flags
+        # Write address, header and payload in one burst. The slice is kept
+        # while the packet length stays the same.
+        if len(self._tx_burst) != length + 5:
+            self._tx_burst = self._tx_view[: length + 5]
+        self.cs.value(0)
+        self.spi.write(self._tx_burst)
+        self.cs.value(1)
         # Write payload and header length.
-        self._write_u8(_RH_RF95_REG_22_PAYLOAD_LENGTH, len(payload))
+        self._write_u8(_RH_RF95_REG_22_PAYLOAD_LENGTH, length + 4)
         # Turn on transmit mode to send out the packet.
         self.transmit()
-        # Wait for tx done interrupt with explicit polling (not ideal but
-        # best that can be done right now without interrupts).
-        start = time.ticks_ms()
-        timed_out = False
-        while not timed_out and not self.tx_done():
-            if time.ticks_diff(time.ticks_ms(), start) >= self.xmit_timeout:
-                timed_out = True
+
+    def _finish_send(self, keep_listening, timed_out):
+        if not timed_out:
+            # The chip returns to standby by itself after TxDone.
+            self._shadow[_RH_RF95_REG_01_OP_MODE] = (
+                self._shadow[_RH_RF95_REG_01_OP_MODE] & 0xF8
+            ) | STANDBY_MODE
         # Listen again if necessary and return the result packet.
         if keep_listening:
             self.listen()
@@ -663,7 +1105,6 @@ class RFM9x:
             self.idle()
         # Clear interrupt.
         self._write_u8(_RH_RF95_REG_12_IRQ_FLAGS, 0xFF)
-        return not timed_out
 
     def send_with_ack(self, data):
         """Reliable Datagram mode:
@@ -0,0 +1,265 @@
+# Telemetry framing shared by the flight computer and the ground station.
+# Pure Python on purpose (no machine/micropython imports) so the same layout is
+# used by MicroPython on the rocket and by CPython on the ground.
+#
+# A batch packet carries up to MAX_SAMPLES consecutive IMU samples behind one
+# header and one copy of the per-packet fields: position, pressure and the
+# attitude of the newest sample. Acceleration and angular rate go out for every
+# sample; at 100 Hz a full quaternion per sample as well would not fit the
+# airtime of even the fastest modem profile, and the rates carry the motion
+# between two attitudes. Every field is an integer
+# at the resolution of the sensor that produced it. The field tables below are
+# the only definition of the layout: the struct formats used by the flight
+# encoder and the ground decoders are derived from them.
+#
+# VERSION changes whenever the layout does; the ground drops other versions.
+# First bytes from 0xF0 up are reserved for other packet types (lib.fec).
+import struct
+
+VERSION = 2
+
+# (name, struct code, scale to engineering units or None, unit)
+# A field named <name>_hi carries the bits of <name> above its own width.
+HEADER_FIELDS = (
+    ("version", "B", None, ""),
+    ("seq", "H", None, ""),
+    ("base_tick", "I", None, "ms"),  # time.ticks_ms() of the first sample
+    ("count", "B", None, ""),  # samples in the packet
+)
+SLOW_FIELDS = (
+    ("latitude", "i", 1e-7, "deg"),
+    ("longitude", "i", 1e-7, "deg"),
+    ("altitude", "i", 1 / 1000, "m"),
+    ("pressure", "H", None, "Pa"),  # uint24: low 16 bits
+    ("pressure_hi", "B", None, "Pa"),  # uint24: high 8 bits
+    ("qw", "h", 1 / (1 << 14), ""),  # raw BNO055 quaternion of the newest sample
+    ("qx", "h", 1 / (1 << 14), ""),
+    ("qy", "h", 1 / (1 << 14), ""),
+    ("qz", "h", 1 / (1 << 14), ""),
+)
+# Fields of SLOW_FIELDS that belong to the newest sample of the packet only
+NEWEST_FIELDS = ("qw", "qx", "qy", "qz")
+# Raw BNO055 counts after dt, read from the raw sample at the word offsets
+# given to BatchEncoder.
+SAMPLE_FIELDS = (
+    ("dt", "B", None, "ms"),  # since base_tick, clamped at 255
+    ("ax", "h", 1 / 100, "m/s^2"),
+    ("ay", "h", 1 / 100, "m/s^2"),
+    ("az", "h", 1 / 100, "m/s^2"),
+    ("gx", "h", 1 / 16, "deg/s"),
+    ("gy", "h", 1 / 16, "deg/s"),
+    ("gz", "h", 1 / 16, "deg/s"),
+)
+
+
+def struct_format(fields):
+    """Little endian struct format of a field table."""
+    return "<" + "".join(field[1] for field in fields)
+
+
+def field_index(fields, name):
+    """Position of the field called name in a field table."""
+    for i in range(len(fields)):
+        if fields[i][0] == name:
+            return i
+    raise KeyError(name)
+
+
+# BatchEncoder.encode packs the header, the slow values ahead of the newest
+# sample's raw words, and dt ahead of each sample's raw words, in this order;
+# the raw words themselves follow the tables. Fail on import rather than
+# send a layout the ground reads differently.
+_names = tuple(field[0] for field in HEADER_FIELDS)
+assert _names == ("version", "seq", "base_tick", "count"), _names
+_names = tuple(field[0] for field in SLOW_FIELDS)
+assert _names == ("latitude", "longitude", "altitude", "pressure", "pressure_hi") + NEWEST_FIELDS, _names
+assert SAMPLE_FIELDS[0][0] == "dt" and len(SAMPLE_FIELDS) == 7, SAMPLE_FIELDS
+del _names
+
+
+HEADER_FORMAT = struct_format(HEADER_FIELDS)
+SLOW_FORMAT = struct_format(SLOW_FIELDS)
+SAMPLE_FORMAT = struct_format(SAMPLE_FIELDS)
+
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SLOW_SIZE = struct.calcsize(SLOW_FORMAT)
+SAMPLE_SIZE = struct.calcsize(SAMPLE_FORMAT)
+
+# Layouts are packed with _pack_into(layout, buf, offset, *values).
+try:
+    # CPython: each format is compiled once and packed with the unbound
+    # Struct.pack_into, skipping the format cache lookup.
+    _compile = struct.Struct
+    _pack_into = struct.Struct.pack_into
+except AttributeError:
+    # MicroPython has no Struct. Its pack_into walks the constant format
+    # string in C without allocating, so the format itself is the layout.
+    def _compile(fmt):
+        return fmt
+
+    _pack_into = struct.pack_into
+
+_HEADER = _compile(HEADER_FORMAT)
+_SLOW = _compile(SLOW_FORMAT)
+_SAMPLE = _compile(SAMPLE_FORMAT)
+
+MAX_PAYLOAD = 251  # RFM9x.tx_payload, a LoRa packet less the RadioHead header
+MAX_SAMPLES = (MAX_PAYLOAD - HEADER_SIZE - SLOW_SIZE) // SAMPLE_SIZE
+
+# Positions of the vectors within the unpacked blocks
+_LATITUDE = field_index(SLOW_FIELDS, "latitude")
+_LONGITUDE = field_index(SLOW_FIELDS, "longitude")
+_ALTITUDE = field_index(SLOW_FIELDS, "altitude")
+_PRESSURE = field_index(SLOW_FIELDS, "pressure")
+_PRESSURE_HI = field_index(SLOW_FIELDS, "pressure_hi")
+_QUAT = field_index(SLOW_FIELDS, "qw")
+_PRESSURE_BITS = 8 * struct.calcsize(SLOW_FIELDS[_PRESSURE][1])
+_PRESSURE_MASK = (1 << _PRESSURE_BITS) - 1
+_DT = field_index(SAMPLE_FIELDS, "dt")
+_ACCEL = field_index(SAMPLE_FIELDS, "ax")
+_GYRO = field_index(SAMPLE_FIELDS, "gx")
+
+# Packet counts to engineering units, as listed in the field tables
+DEGREE_SCALE = SLOW_FIELDS[_LATITUDE][2]
+ALTITUDE_SCALE = SLOW_FIELDS[_ALTITUDE][2]
+QUAT_SCALE = SLOW_FIELDS[_QUAT][2]
+ACCEL_SCALE = SAMPLE_FIELDS[_ACCEL][2]
+GYRO_SCALE = SAMPLE_FIELDS[_GYRO][2]
+
+
+def packet_seq(packet):
+    """Sequence number of a batch packet of this VERSION, or None."""
+    if len(packet) < HEADER_SIZE or packet[0] != VERSION:
+        return None
+    return packet[1] | (packet[2] << 8)
+
+
+def batch_size(count):
+    """Size in bytes of a batch packet holding count samples."""
+    return HEADER_SIZE + SLOW_SIZE + count * SAMPLE_SIZE
+
+
+class BatchEncoder:
+    """Packs raw IMU samples, as buffered by the flight computer, into batch
+    packets. words maps the name of each raw field (NEWEST_FIELDS and the
+    SAMPLE_FIELDS after dt) to its word offset within one raw sample of
+    stride words.
+    Position is taken in the GpsFix units (1e-7 degrees, mm) and pressure in Pa.
+    Encoding allocates nothing beyond rounding the pressure, so it can run in
+    the transmit loop without feeding the garbage collector.
+    """
+
+    def __init__(self, words, stride):
+        # raw word offsets in the order the tables pack them
+        self.newest = tuple(words[name] for name in NEWEST_FIELDS)
+        self.sample = tuple(words[field[0]] for field in SAMPLE_FIELDS[1:])
+        self.stride = stride
+        self.seq = 0
+        """Sequence number of the next packet, wraps at 16 bits."""
+
+    def encode(self, buf, raw, ticks, count, latitude, longitude, altitude, pressure):
+        """Write a packet of the first count samples of raw, sampled at ticks,
+        into buf.
+
+           Returns: the packet length in bytes.
+        """
+        pack_into = _pack_into
+        sample = _SAMPLE
+        stride = self.stride
+        count = min(count, MAX_SAMPLES)
+        base = ticks[0]
+        pack_into(_HEADER, buf, 0, VERSION, self.seq, base, count)
+        pressure = min(max(int(pressure + 0.5), 0), 0xFFFFFF)
+        w0, w1, w2, w3 = self.newest
+        r = (count - 1) * stride
+        pack_into(
+            _SLOW, buf, HEADER_SIZE,
+            latitude, longitude, altitude,
+            pressure & _PRESSURE_MASK, pressure >> _PRESSURE_BITS,
+            raw[r + w0], raw[r + w1], raw[r + w2], raw[r + w3],
+        )
+        offset = HEADER_SIZE + SLOW_SIZE
+        w0, w1, w2, w3, w4, w5 = self.sample
+        r = 0
+        for i in range(count):
+            # Masked to the ticks_ms period so the wrap cancels. A full batch
+            # at 100 Hz spans 150 ms; a sample more than 255 ms after the
+            # first (the sampler stalled) reads as 255 on the ground, without
+            # moving the samples after it.
+            dt = (ticks[i] - base) & 0x3FFFFFFF
+            pack_into(
+                sample, buf, offset,
+                dt if dt < 0xFF else 0xFF,
+                raw[r + w0], raw[r + w1], raw[r + w2],
+                raw[r + w3], raw[r + w4], raw[r + w5],
+            )
+            offset += SAMPLE_SIZE
+            r += stride
+        self.seq = (self.seq + 1) & 0xFFFF
+        return offset
+
+
+def decode_batch(packet):
+    """Unpack a batch packet on the ground.
+
+       Returns: (seq, base_tick, (latitude, longitude, altitude, pressure,
+       quaternion), samples) where the quaternion is that of the newest
+       sample and samples is a list of (tick, accel, gyro)
+       tuples, all in engineering units (degrees, m, Pa, ...), or None if the
+       packet is not a well formed batch of this VERSION.
+    """
+    if len(packet) < HEADER_SIZE + SLOW_SIZE:
+        return None
+    version, seq, base, count = struct.unpack_from(HEADER_FORMAT, packet, 0)
+    if version != VERSION or count > MAX_SAMPLES or len(packet) < batch_size(count):
+        return None
+    s = struct.unpack_from(SLOW_FORMAT, packet, HEADER_SIZE)
+    slow = (
+        s[_LATITUDE] * DEGREE_SCALE, s[_LONGITUDE] * DEGREE_SCALE,
+        s[_ALTITUDE] * ALTITUDE_SCALE, s[_PRESSURE] | (s[_PRESSURE_HI] << _PRESSURE_BITS),
+        tuple(v * QUAT_SCALE for v in s[_QUAT:_QUAT + 4]),
+    )
+    samples = []
+    offset = HEADER_SIZE + SLOW_SIZE
+    for _ in range(count):
+        s = struct.unpack_from(SAMPLE_FORMAT, packet, offset)
+        samples.append((
+            base + s[_DT],
+            tuple(v * ACCEL_SCALE for v in s[_ACCEL:_ACCEL + 3]),
+            tuple(v * GYRO_SCALE for v in s[_GYRO:_GYRO + 3]),
+        ))
+        offset += SAMPLE_SIZE
+    return seq, base, slow, samples
+
+
+# Serial bridge framing, used by the ground receiver to forward every packet
+# with its link metadata to the host over USB:
+#
+#   sync 0xA5 0x5A, <BIhb length, rx tick (ms), rssi (dBm), snr (0.25 dB),
+#   the packet, then the low byte of the sum of every byte after the sync
+BRIDGE_SYNC = b"\xa5\x5a"
+BRIDGE_HEADER_FORMAT = "<BIhb"
+BRIDGE_HEADER_SIZE = struct.calcsize(BRIDGE_HEADER_FORMAT)
+BRIDGE_MAX_FRAME = len(BRIDGE_SYNC) + BRIDGE_HEADER_SIZE + 255 + 1
+
+
+def bridge_frame(buf, packet, length, rx_tick, rssi, snr):
+    """Wrap the first length bytes of packet into a bridge frame in buf, which
+    must hold BRIDGE_MAX_FRAME bytes. snr is in dB.
+
+       Returns: the frame length in bytes.
+    """
+    buf[0] = BRIDGE_SYNC[0]
+    buf[1] = BRIDGE_SYNC[1]
+    struct.pack_into(
+        BRIDGE_HEADER_FORMAT, buf, 2,
+        length, rx_tick & 0xFFFFFFFF, int(rssi), int(round(snr * 4)),
+    )
+    start = 2 + BRIDGE_HEADER_SIZE
+    end = start + length
+    buf[start:end] = packet[:length]
+    total = 0
+    for i in range(2, end):
+        total += buf[i]
+    buf[end] = total & 0xFF
+    return end + 1
@@ -4,12 +4,14 @@ import asyncio
 
 async def main():
     flight = FlightComputer()
+    flight.imu.start()
 
     gps_task = asyncio.create_task(flight.poll_gps())
     transmit_task = asyncio.create_task(flight.transmit())
+    log_task = asyncio.create_task(flight.logger.log())
     flush_task = asyncio.create_task(flight.logger.flush())
 
-    await asyncio.gather(gps_task, transmit_task, flush_task)
+    await asyncio.gather(gps_task, transmit_task, log_task, flush_task)
 
 
 if __name__ == '__main__':
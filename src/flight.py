@@ -1,13 +1,15 @@
-import asyncio
-import struct
+from array import array
 
 from machine import SPI, Pin, I2C
-from lib.l86gps import L86GPS
+from lib.l86gps import L86GPS, GpsFix
 from lib.rfm9x import RFM9x
 from lib.bno055 import BNO055
 from lib.bmp388 import DFRobot_BMP388_SPI
-from src.rf import initialize_rf
+from src.rf import initialize_rf, TxScheduler
 from src.logger import Logger
+from lib.telemetry import BatchEncoder, MAX_SAMPLES, batch_size
+from lib.fec import FecEncoder
+from src.imu import ImuSampler, SAMPLE_WORDS, TELEMETRY_WORDS
 
 class FlightComputer:
     """
@@ -19,11 +21,23 @@ class FlightComputer:
 
     rf: RFM9x  # radio frequency transceiver module for telemetry data transmission to ground station
 
+    scheduler: TxScheduler  # paces transmissions to the airtime of the active modem profile
+
     bno: BNO055  # 9-dof inertial measurement unit providing acceleration, gyroscopic, and quaternion data for precise orientation tracking
 
     bmp: DFRobot_BMP388_SPI  # barometric pressure sensor for altitude determination and atmospheric measurements
 
-    gps_data: dict  # storage container for the most recent valid gps coordinate and altitude information
+    imu: ImuSampler  # timer driven bno055 acquisition at the sensor's fusion rate, consumed in batches
+
+    imu_raw: array  # batch of raw imu samples drained from the sampler for one packet
+
+    imu_ticks: array  # tick timestamps of the samples in imu_raw
+
+    encoder: BatchEncoder  # packs a batch of imu samples and the latest slow sensors into one packet
+
+    fec: FecEncoder | None  # parity packets sent after every group of telemetry packets, none to disable
+
+    gps_data: GpsFix  # most recent valid gps fix (1e-7 degree coordinates, altitude in mm, decode tick), updated in place
 
     logger: Logger
 
@@ -33,41 +47,48 @@ class FlightComputer:
         configures communication buses, sensor parameters, and initializes data structures.
         """
         self.gps = L86GPS()
+        if not self.gps.configure_high_rate(rate_hz=10, baudrate=115200):  # gga + rmc only, 10 fixes per second
+            print(f"gps high rate mode failed, uart left at {self.gps.baudrate} baud")
         self.rf = initialize_rf()
 
         bno_i2c = I2C(0, sda=Pin(4), scl=Pin(5), timeout=100_000)
         self.bno = BNO055(bno_i2c, address=0x28, crystal=True, transpose=(0, 1, 2), sign=(0, 0, 0))
+        self.imu = ImuSampler(self.bno, rate_hz=100)
+        self.imu_raw = array('h', bytearray(2 * SAMPLE_WORDS * MAX_SAMPLES))
+        self.imu_ticks = array('i', bytearray(4 * MAX_SAMPLES))
+        self.encoder = BatchEncoder(TELEMETRY_WORDS, SAMPLE_WORDS)
+        self.fec = FecEncoder(k=8, m=1)  # one lost packet in every 8 is rebuilt on the ground
+        # one full batch per packet keeps up with the imu rate, as long as the profile's
+        # airtime fits a full batch and its share of the repairs in that period
+        self.scheduler = TxScheduler(self.rf, target_ms=MAX_SAMPLES * 1000 // self.imu.rate_hz, fec=self.fec)
+        if self.scheduler.plan(batch_size(MAX_SAMPLES)) > self.scheduler.target_ms:
+            # a slow profile keeps the telemetry rate rather than the repairs
+            print("fec disabled, no airtime left for repairs")
+            self.fec = None
+            self.scheduler.use_fec(None)
+        period_ms = self.scheduler.plan(batch_size(MAX_SAMPLES))
+        if period_ms > self.scheduler.target_ms:
+            # the scheduler stretches the period; transmit() then sends the newest samples
+            # and the older ones are counted in imu.skipped
+            print(f"telemetry every {period_ms} ms, {MAX_SAMPLES} of {period_ms * self.imu.rate_hz // 1000} imu samples per packet")
 
         bmp_spi = SPI(1, baudrate=100000, polarity=0, phase=0, sck=Pin(10), mosi=Pin(11), miso=Pin(8))
         self.bmp = DFRobot_BMP388_SPI(bmp_spi, Pin(9, Pin.OUT))
 
-        self.gps_data = {
-            'latitude': 0.0,
-            'longitude': 0.0,
-            'altitude': 0.0,
-        }
+        self.gps_data = GpsFix()
 
         self.logger = Logger()
 
     async def poll_gps(self):
         """
-        asynchronous task that continuously acquires gps data at regular intervals.
-        processes and validates incoming nmea sentences, extracting position information
-        when available. updates the internal gps_data dictionary with valid coordinates.
-        
-        operates at 10hz polling frequency to maintain reliable data acquisition without
-        overwhelming the serial interface.
+        asynchronous task that continuously acquires gps data.
+        waits on the uart through an asyncio stream reader, so the task only wakes when
+        nmea bytes arrive and publishes each new gga/rmc fix as soon as its sentence is
+        complete. the fix record is updated in place together with the tick at which it
+        was decoded, so no gps data is allocated per sentence.
         """
-        while True:
-            gps_values = self.gps.read_gps()
-            if gps_values and gps_values['type'] == 'GPGGA' and gps_values['status'] == 'valid':
-                self.gps_data = {
-                    'latitude': gps_values['latitude'],
-                    'longitude': gps_values['longitude'],
-                    'altitude': gps_values['altitude']
-                }
-
-            await asyncio.sleep(0.1)  # 10hz polling frequency provides optimal balance between responsiveness and system stability, nothing above 0.1 of starts spazzing
+        async for fix in self.gps.fixes():
+            self.gps_data = fix
 
     async def transmit(self):
         """
@@ -75,37 +96,55 @@ class FlightComputer:
         to the ground station. encodes all relevant flight parameters into a compact binary format 
         for efficient radio transmission. 
         
-        operates at 20hz transmission rate to provide high-resolution flight data while
-        maintaining reliable rf link performance.
+        each packet carries every imu sample buffered since the previous one (up to a full
+        batch), so the packet rate only needs to be imu rate / batch size. the scheduler
+        slows it down when the packets do not fit that slot with the active modem profile,
+        so the loop never backs up.
+        after every group of packets the fec encoder's repair packets are sent straight
+        away; the scheduler budgets their airtime in the slots of the data packets.
         """
         while True:
-            data = self.encode_transmission_data()
-            if data:
-                await self.logger.log()
-                self.rf.send(data)
-                print("Data sent")
-
-            await asyncio.sleep(0.05)  # 20hz transmission frequency ensures timely delivery of critical flight parameters.
-
-    def encode_transmission_data(self) -> bytes | None:
+            length = self.encode_transmission_data(self.rf.tx_payload)  # encoded in place in the radio's frame buffer
+            if length:
+                seq = (self.encoder.seq - 1) & 0xFFFF
+                if self.fec is not None:
+                    self.fec.add(self.rf.tx_payload, length, seq)
+                await self._send(length, seq)
+                if self.fec is not None and self.fec.ready:
+                    for j in range(self.fec.m):
+                        await self._send(self.fec.repair_into(j, self.rf.tx_payload), seq)
+                await self.scheduler.wait(length)
+            else:
+                await self.imu.wait()  # nothing sampled since the last packet
+
+    async def _send(self, length: int, seq: int):
+        # the radiohead identifier follows the newest telemetry sequence number, so
+        # frames can be told apart at the radio level as well
+        await self.rf.send_payload_async(length, identifier=seq & 0xFF)
+        self.scheduler.sent(length)
+
+    def encode_transmission_data(self, buf) -> int | None:
         """
         encodes sensor telemetry into a compact binary format suitable for radio transmission.
-        
-        utilizes the struct module to create a standardized binary packet containing:
-        - quaternion orientation data (4 float values)
-        - gps position coordinates (latitude, longitude, altitude)
-        - barometric pressure reading
-        - acceleration vector components (x, y, z)
-        - angular velocity measurements (x, y, z)
-        
+
+        packs one batch packet (see lib.telemetry) into buf containing:
+        - sequence number and tick of the first imu sample
+        - gps position coordinates (latitude, longitude at 1e-7 degrees, altitude in mm)
+          and barometric pressure in pa, and the raw quaternion of the newest imu sample
+        - for each imu sample buffered since the last packet: its tick offset from the
+          previous one and the raw acceleration and angular velocity counts. when the link fell more
+          than a packet behind only the newest samples are sent, so the ground sees
+          current data (the rest is counted in imu.skipped)
+
         returns:
-            bytes: binary packet containing all flight telemetry data
-            none: if encoding fails
+            int: number of bytes written to buf
+            none: if no imu sample is available
         """
-        format_string = '<14f'  # 14 floating point values for the bno's
-        return struct.pack(format_string,
-                        *self.bno.quaternion(),
-                           self.gps_data["latitude"], self.gps_data["longitude"], self.gps_data["altitude"],
-                           0.0,
-                           *self.bno.accel(),
-                           *self.bno.gyro())
\ No newline at end of file
+        n = self.imu.drain(self.imu_raw, self.imu_ticks, newest=True)
+        if not n:
+            return None
+        pressure, _ = self.bmp.read_measurement()
+        # the fix is already held in the packet's integer units, no conversion needed
+        return self.encoder.encode(buf, self.imu_raw, self.imu_ticks, n,
+                                   self.gps_data.latitude, self.gps_data.longitude,
+                                   self.gps_data.altitude, pressure)
@@ -0,0 +1,162 @@
+import asyncio
+import micropython
+import time
+from array import array
+
+from machine import Timer
+from lib.bno055 import BNO055, BNO055Sample, ACCEL_SCALE, MAG_SCALE, GYRO_SCALE, EULER_SCALE, QUAT_SCALE
+
+# word offsets of each vector within one raw sample (the bno055 0x08-0x33 register block)
+ACCEL = 0
+MAG = 3
+GYRO = 6
+EULER = 9
+QUAT = 12
+LIN_ACC = 16
+GRAVITY = 19
+SAMPLE_WORDS = 22
+
+# word offset of each component by its lib.telemetry field name, see BatchEncoder
+TELEMETRY_WORDS = {
+    'qw': QUAT, 'qx': QUAT + 1, 'qy': QUAT + 2, 'qz': QUAT + 3,
+    'ax': ACCEL, 'ay': ACCEL + 1, 'az': ACCEL + 2,
+    'gx': GYRO, 'gy': GYRO + 1, 'gz': GYRO + 2,
+}
+
+
+def _scale(raw, offset, dest, scale):
+    for i in range(len(dest)):
+        dest[i] = raw[offset + i] * scale
+
+
+def decode(raw: array, offset: int, sample: BNO055Sample) -> BNO055Sample:
+    """
+    scale the raw sample starting at word offset of raw into the vectors of sample,
+    in the same units as BNO055.read_all.
+    """
+    _scale(raw, offset + ACCEL, sample.accel, ACCEL_SCALE)
+    _scale(raw, offset + MAG, sample.mag, MAG_SCALE)
+    _scale(raw, offset + GYRO, sample.gyro, GYRO_SCALE)
+    _scale(raw, offset + EULER, sample.euler, EULER_SCALE)
+    _scale(raw, offset + QUAT, sample.quaternion, QUAT_SCALE)
+    _scale(raw, offset + LIN_ACC, sample.lin_acc, ACCEL_SCALE)
+    _scale(raw, offset + GRAVITY, sample.gravity, ACCEL_SCALE)
+    return sample
+
+
+class ImuSampler:
+    """
+    fixed-rate bno055 acquisition decoupled from the asyncio loop.
+    a hardware timer schedules a burst read of every data register at rate_hz and stores
+    the raw int16 words, with a tick timestamp, into a preallocated ring buffer.
+    asyncio tasks consume the buffered samples in batches, so imu sampling follows the
+    sensor's fusion rate instead of the transmit rate and its scheduling jitter.
+    """
+
+    bno: BNO055  # imu being sampled
+
+    rate_hz: int  # sampling frequency of the timer
+
+    ring: array  # int16 ring of depth samples, SAMPLE_WORDS words each
+
+    ticks: array  # time.ticks_ms() at which each ring slot was sampled
+
+    overruns: int  # samples dropped because the consumer fell behind and the ring was full
+
+    skipped: int  # old samples discarded by drain(newest=True) to keep the consumer current
+
+    errors: int  # scheduled reads that could not be queued or failed on the bus
+
+    def __init__(self, bno: BNO055, rate_hz: int = 100, depth: int = 64):
+        self.bno = bno
+        self.rate_hz = rate_hz
+        self.depth = depth
+        self.ring = array('h', bytearray(2 * SAMPLE_WORDS * depth))
+        ring = memoryview(self.ring)
+        # slots are created once so the sampling callback never allocates
+        self._slots = [ring[i * SAMPLE_WORDS:(i + 1) * SAMPLE_WORDS] for i in range(depth)]
+        self.ticks = array('i', bytearray(4 * depth))
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self._head = 0
+        self._tail = 0
+        self._timer = None
+        self._ready = asyncio.ThreadSafeFlag()
+        self._sample_cb = self._sample  # bound method created once, handed to micropython.schedule
+
+    def start(self):
+        """
+        start the sampling timer. the timer callback only schedules the read, so it is safe
+        whether the port runs timer callbacks in hard or soft interrupt context.
+        """
+        self._timer = Timer(period=1000 // self.rate_hz, mode=Timer.PERIODIC, callback=self._tick)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _tick(self, _timer):
+        try:
+            micropython.schedule(self._sample_cb, None)
+        except RuntimeError:  # schedule queue full
+            self.errors += 1
+
+    def _sample(self, _arg):
+        # single producer: only _head is written here, the consumer only writes _tail
+        head = self._head
+        nxt = head + 1
+        if nxt == self.depth:
+            nxt = 0
+        if nxt == self._tail:
+            self.overruns += 1
+            return
+        self.ticks[head] = time.ticks_ms()
+        try:
+            self.bno.iget_block(self._slots[head])
+        except OSError:
+            self.errors += 1
+            return
+        self._head = nxt
+        self._ready.set()
+
+    def available(self) -> int:
+        """number of buffered samples not yet consumed."""
+        return (self._head - self._tail) % self.depth
+
+    async def wait(self):
+        """wait until at least one new sample has been buffered."""
+        while self._head == self._tail:
+            await self._ready.wait()
+
+    def drain(self, dest: array, ticks: array, newest: bool = False) -> int:
+        """
+        move buffered samples, oldest first, into dest (an int16 array holding whole samples)
+        and their timestamps into ticks.
+        with newest, a backlog larger than dest is first cut down to the samples that fit,
+        dropping the oldest (counted in skipped), so a live consumer that fell behind gets
+        current data instead of working through stale samples. only the consumer moves the
+        read index, so this stays safe against the sampling callback.
+
+        returns:
+            int: number of samples copied
+        """
+        limit = min(len(dest) // SAMPLE_WORDS, len(ticks))
+        out = memoryview(dest)
+        n = 0
+        tail = self._tail
+        if newest:
+            backlog = (self._head - tail) % self.depth
+            if backlog > limit:
+                self.skipped += backlog - limit
+                tail = (tail + backlog - limit) % self.depth
+        while tail != self._head and n < limit:
+            out[n * SAMPLE_WORDS:(n + 1) * SAMPLE_WORDS] = self._slots[tail]
+            ticks[n] = self.ticks[tail]
+            n += 1
+            tail += 1
+            if tail == self.depth:
+                tail = 0
+        self._tail = tail
+        return n
@@ -1,8 +1,12 @@
+import asyncio
+import time
+
+from lib.fec import FecEncoder, REPAIR_SIZE
 from lib.rfm9x import RFM9x
-from machine import SPI, Pin, I2C
+from machine import SPI, Pin
 
 
-def initialize_rf() -> RFM9x:
+def initialize_rf(dio0_pin: int | None = None, profile: str = "max-throughput") -> RFM9x:
     CS = Pin(17, Pin.OUT)
     RESET = Pin(16, Pin.OUT)
     spi = SPI(0,
@@ -17,10 +21,112 @@ def initialize_rf() -> RFM9x:
               )
 
     rf = RFM9x(spi, CS, RESET, 915.0)
-    rf.tx_power = 14
-    rf.signal_bandwidth = 500000
-    rf.coding_rate = 5
-    rf.spreading_factor = 7
-    rf.enable_crc = True
+    # the whole modem configuration is switched in one go, see RFM9x.PROFILES
+    rf.apply_profile(profile)
+
+    # with dio0 wired the async send path sleeps on the interrupt instead of polling
+    if dio0_pin is not None:
+        rf.attach_dio0(Pin(dio0_pin, Pin.IN))
 
     return rf
+
+
+class TxScheduler:
+    """
+    paces telemetry packets to what the active modem profile can sustain.
+    the packet period is the requested one, stretched when the time on air of a packet of
+    the current length would key the transmitter for more than the allowed share of the
+    channel. with fec each slot also budgets its share of the repair packets (m for every
+    k data packets), which are sent straight after their group without a slot of their own.
+    utilisation is measured over a rolling window from the airtime actually sent.
+    """
+
+    rf: RFM9x  # radio whose modem configuration determines the airtime
+
+    target_ms: int  # requested packet period
+
+    duty_cycle: float  # largest fraction of time the transmitter may be keyed
+
+    period_ms: int  # packet period in use for the current length and profile
+
+    airtime_us: int  # time on air of one packet of the current length
+
+    slot_us: int  # airtime budgeted per packet, its share of the fec repairs included
+
+    fec: FecEncoder | None  # encoder whose repair packets share the channel, none without fec
+
+    utilisation: float  # fraction of the last window spent transmitting
+
+    late: int  # packets that started more than a period after their slot
+
+    def __init__(self, rf: RFM9x, target_ms: int = 50, duty_cycle: float = 0.9, window_ms: int = 1000,
+                 fec: FecEncoder | None = None):
+        self.rf = rf
+        self.fec = fec
+        self.target_ms = target_ms
+        self.duty_cycle = duty_cycle
+        self.window_ms = window_ms
+        self.period_ms = target_ms
+        self.airtime_us = 0
+        self.slot_us = 0
+        self.utilisation = 0.0
+        self.late = 0
+        self._length = 0
+        self._epoch = -1
+        self._next = time.ticks_ms()
+        self._window_start = self._next
+        self._window_airtime_us = 0
+
+    def plan(self, length: int) -> int:
+        """
+        returns the packet period in ms for packets of length payload bytes.
+        recomputed only when the length or a register the airtime depends on changes
+        (see RFM9x.modem_epoch), whether through a profile or an individual setter.
+        """
+        if length != self._length or self.rf.modem_epoch != self._epoch:
+            self._length = length
+            self._epoch = self.rf.modem_epoch
+            self.airtime_us = self.rf.time_on_air(length)
+            self.slot_us = self.airtime_us
+            fec = self.fec
+            if fec is not None:
+                # a repair is as long as the longest packet of its group plus its header
+                self.slot_us += fec.m * self.rf.time_on_air(REPAIR_SIZE + length) // fec.k
+            min_period_ms = -(-self.slot_us // int(1000 * self.duty_cycle))
+            self.period_ms = max(self.target_ms, min_period_ms)
+        return self.period_ms
+
+    def use_fec(self, fec: FecEncoder | None):
+        """budgets the repair packets of fec from now on, or none when fec is turned off."""
+        self.fec = fec
+        self._epoch = -1
+
+    def rate_hz(self, length: int) -> float:
+        """highest sustainable packet rate for packets of length payload bytes."""
+        return 1000 / self.plan(length)
+
+    def sent(self, length: int):
+        """accounts a transmitted packet of length payload bytes towards the utilisation."""
+        if length == self._length and self.rf.modem_epoch == self._epoch:
+            self._window_airtime_us += self.airtime_us
+        else:  # a repair, or a short data packet, keeps the plan of the full ones
+            self._window_airtime_us += self.rf.time_on_air(length)
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._window_start)
+        if elapsed >= self.window_ms:
+            self.utilisation = self._window_airtime_us / (1000 * elapsed)
+            self._window_start = now
+            self._window_airtime_us = 0
+
+    async def wait(self, length: int):
+        """sleeps until the next slot for packets of length payload bytes."""
+        self._next = time.ticks_add(self._next, self.plan(length))
+        delay = time.ticks_diff(self._next, time.ticks_ms())
+        if delay > 0:
+            await asyncio.sleep_ms(delay)
+        elif delay <= -self.period_ms:
+            # more than a slot behind, restart the slots from now instead of bursting
+            # to catch up
+            self.late += 1
+            self._next = time.ticks_ms()
+        # less than a slot behind (after the repairs) the next slots absorb the delay
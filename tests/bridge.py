@@ -0,0 +1,48 @@
+from lib.rfm9x import *
+from lib.telemetry import bridge_frame, BRIDGE_MAX_FRAME
+from machine import SPI, Pin
+import asyncio
+import sys
+
+# Ground receiver forwarding every packet to the ground station host over USB
+# serial (python -m ground.ingest --serial <port> <session dir>).
+# Nothing else may be printed: stdout carries the binary bridge frames.
+
+# Pin Configuration
+CS = Pin(17, Pin.OUT)
+RESET = Pin(16, Pin.OUT)
+spi = SPI(0, 
+    baudrate=1000000, 
+    polarity=0, 
+    phase=0, 
+    bits=8, 
+    firstbit=SPI.MSB,
+    sck=Pin(18), 
+    mosi=Pin(19), 
+    miso=Pin(16)
+)
+# Set to the Pin wired to the radio's G0/DIO0 to drain packets on interrupt,
+# otherwise the receive loop polls the IRQ flags.
+DIO0 = None
+
+RADIO_FREQ_MHZ = 915.0
+
+
+async def main(rfm9x):
+    packet = bytearray(252)
+    frame = bytearray(BRIDGE_MAX_FRAME)
+    out = sys.stdout.buffer
+    while True:
+        n = await rfm9x.receive_async(packet, timeout=5000)
+        if n:
+            length = bridge_frame(frame, packet, n, rfm9x.last_rx_ticks, rfm9x.last_rssi, rfm9x.last_snr)
+            out.write(memoryview(frame)[:length])
+
+
+rfm9x = RFM9x(spi, CS, RESET, RADIO_FREQ_MHZ)
+# Must match the profile the flight computer transmits with
+rfm9x.apply_profile("max-throughput")
+if DIO0 is not None:
+    rfm9x.attach_dio0(DIO0)
+rfm9x.start_continuous_receive(depth=16)
+asyncio.run(main(rfm9x))
@@ -1,7 +1,48 @@
-from lib.l86gps import L86GPS
+from lib.l86gps import L86GPS, NMEAParser, GGA, TXT, ANTENNA_STATUS
 import time
 
 
+def _sentence(body):
+    csum = 0
+    for c in body:
+        csum ^= ord(c)
+    return '$%s*%02X\r\n' % (body, csum)
+
+
+def _feed(parser, body):
+    data = _sentence(body).encode()
+    return parser.feed(data, len(data))
+
+
+def check_parser():
+    # A sentence with a valid checksum but a malformed field must be dropped
+    # without touching the fix or publishing it as a new one
+    parser = NMEAParser()
+    fix = parser.fix
+    assert _feed(parser, 'GPGGA,123519.000,4807.0380,N,01131.0000,E,1,08,0.9,545.4,M,46.9,M,,') == GGA
+    assert parser.fixes == 1
+    good = (fix.time, fix.latitude, fix.longitude, fix.altitude, fix.quality, fix.satellites)
+    assert fix.latitude == 481173000 and fix.time == 45319000
+
+    dropped = parser.dropped
+    assert _feed(parser, 'GPGGA,123520.000,48x7.0380,N,01131.0000,E,1,09,0.9,545.4,M,46.9,M,,') == 0
+    assert parser.dropped == dropped + 1
+    assert (fix.time, fix.latitude, fix.longitude, fix.altitude, fix.quality, fix.satellites) == good
+    assert _feed(parser, 'GPRMC,123521.000,A,4807.038,N,01131.000,E,0x22.4,084.4,230394,,') == 0
+    assert not fix.rmc_valid and fix.time == good[0]
+
+    # neither the rejected sentences nor the next one may publish them as a
+    # fix, fixes is what L86GPS.take_fix() and fixes() are driven by
+    assert parser.fixes == 1
+    assert _feed(parser, 'GPTXT,01,01,02,ANTSTATUS=OK') == TXT
+    assert parser.fixes == 1
+
+    assert _feed(parser, 'GPRMC,123521.000,A,4807.038,N,01131.000,E,022.4,084.4,230394,,') != 0
+    assert fix.rmc_valid and fix.speed == 22400 and fix.time == 45321000
+    assert parser.fixes == 2
+    print("NMEA parser checks passed")
+
+
 def main():
     # Initialize GPS module with default pins (UART1, TX=0, RX=1)
     gps = L86GPS()
@@ -9,38 +50,33 @@ def main():
     print("GPS Module initialized. Waiting for data...")
 
     while True:
-        # Read GPS data
-        data = gps.read_gps()
-
-        if data:
-            # Process GPGGA sentences (position data)
-            if data['type'] == 'GPGGA':
-                if data['status'] == 'valid':
-                    print("\nGPS Position:")
-                    print(f"Time: {data['time']}")
-                    print(f"Latitude: {data['latitude']}°")
-                    print(f"Longitude: {data['longitude']}°")
-                    print(f"Altitude: {data['altitude']} {data['altitude_unit']}")
-                    print(f"Satellites: {data['satellites']}")
-                    print(f"Fix Quality: {data['quality']}")
-                elif data['status'] == 'no_fix':
-                    print("Waiting for GPS fix...")
-
-            # Process GPRMC sentences (speed and date)
-            elif data['type'] == 'GPRMC':
-                if data['status'] == 'valid':
-                    print("\nGPS Movement:")
-                    print(f"Speed: {data['speed']} knots")
-                    print(f"Date: {data['date']}")
-
-            # Process antenna status messages
-            elif data['type'] == 'GPTXT':
-                print(f"\nAntenna Status: {data['antenna_status']}")
+        # Drain everything the module sent since the last pass
+        updated = gps.update()
+
+        if gps.take_fix():
+            fix = gps.fix
+            print("\nGPS Position:")
+            print(f"Time: {fix.time} ms of day")
+            print(f"Latitude: {fix.latitude / 10000000}°")
+            print(f"Longitude: {fix.longitude / 10000000}°")
+            print(f"Altitude: {fix.altitude / 1000} M")
+            print(f"Satellites: {fix.satellites}")
+            print(f"Fix Quality: {fix.quality}")
+            if fix.rmc_valid:
+                print(f"Speed: {fix.speed / 1000} knots")
+                print(f"Date: {fix.date}")
+        elif updated & GGA and not gps.fix.quality:
+            print("Waiting for GPS fix...")
+
+        # Process antenna status messages
+        if updated & TXT:
+            print(f"\nAntenna Status: {ANTENNA_STATUS[gps.parser.antenna]}")
 
         time.sleep(1)
 
 
 if __name__ == '__main__':
+    check_parser()
     try:
         main()
     except KeyboardInterrupt:
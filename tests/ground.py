@@ -1,6 +1,7 @@
 from lib.rfm9x import *
+from lib.telemetry import decode_batch
 from machine import SPI, Pin
-import time
+import asyncio
 
 # Pin Configuration
 CS = Pin(17, Pin.OUT)
@@ -15,38 +16,50 @@ spi = SPI(0,
     mosi=Pin(19), 
     miso=Pin(16)
 )
+# Set to the Pin wired to the radio's G0/DIO0 to drain packets on interrupt,
+# otherwise the receive loop polls the IRQ flags.
+DIO0 = None
 
 RADIO_FREQ_MHZ = 915.0
 
-# Initialize RFM radio with error handling
-try:
-    rfm9x = RFM9x(spi, CS, RESET, RADIO_FREQ_MHZ)
-    rfm9x.tx_power = 14
-    
-    # Configure for better reliability
-    rfm9x.signal_bandwidth = 125000
-    rfm9x.coding_rate = 5
-    rfm9x.spreading_factor = 7
-    rfm9x.enable_crc = True
-    
+
+async def main(rfm9x):
+    packet = bytearray(252)
+    last_seq = None
+    lost = 0
     print("Waiting for packets...")
     while True:
-        try:
-            # Add timeout to prevent blocking
-            packet = rfm9x.receive(timeout=5.0)
-            if packet is not None:
-                packet_text = str(packet, "ascii")
-                print(f"Received (ASCII): {packet_text}")
-                print(f"RSSI: {rfm9x.last_rssi} dB")
-                print(f"Signal strength: {rfm9x.rssi} dB")
+        # Packets queued by continuous receive are returned back to back
+        n = await rfm9x.receive_async(packet, timeout=5000)
+        if n:
+            batch = decode_batch(memoryview(packet)[:n])
+            if batch is None:
+                print(f"Received {n} bytes: {bytes(packet[:n]).hex()}")
             else:
-                print("Listening...")
-            # Add small delay to prevent CPU overload
-            time.sleep(0.1)
-            
-        except Exception as e:
-            print(f"Reception error: {e}")
-            time.sleep(1)
+                seq, base, (lat, lon, alt, pressure, quat), samples = batch
+                if last_seq is not None:
+                    gap = (seq - last_seq - 1) & 0xFFFF
+                    if gap < 0x8000:  # not a late or repeated packet
+                        lost += gap
+                last_seq = seq
+                tick, accel, gyro = samples[-1]
+                print(f"#{seq} t={base} {len(samples)} samples  {lat:.7f} {lon:.7f} {alt:.1f} m  {pressure:.0f} Pa")
+                print(f"  q={quat} a={accel} g={gyro}")
+            print(f"RSSI: {rfm9x.last_rssi} dB  SNR: {rfm9x.last_snr} dB  dropped: {rfm9x.rx_overruns}  lost: {lost}")
+        else:
+            print("Listening...")
+
+
+# Initialize RFM radio with error handling
+try:
+    rfm9x = RFM9x(spi, CS, RESET, RADIO_FREQ_MHZ)
+    # Must match the profile the flight computer transmits with
+    rfm9x.apply_profile("max-throughput")
+
+    if DIO0 is not None:
+        rfm9x.attach_dio0(DIO0)
+    rfm9x.start_continuous_receive(depth=16)
+    asyncio.run(main(rfm9x))
             
 except Exception as e:
     print(f"Initialization error: {e}")